@@ -29,6 +29,12 @@ import zipfile
 from datetime import datetime
 import shutil
 import hashlib
+import asyncio
+import functools
+import traceback
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from PyPDF2 import PdfReader
 
 # Import our modules
 from pdf_handler import PDFHandler
@@ -55,7 +61,9 @@ from components.email_sender import render_email_form
 from components.link_generator import render_link_generator
 
 # Import template engine for cover letters
-from templates.docx_engine import DOCXTemplateEngine
+from templates.docx_engine import (
+    DOCXTemplateEngine, CaseData, generate_ce_letter, generate_legal_brief
+)
 from components.thumbnail_grid import generate_thumbnail
 
 # Check if compression is available
@@ -674,7 +682,6 @@ def render_stage_2_upload(navigator: StageNavigator, config: Dict):
                         thumb_b64 = None
                         # Try to detect PDF pages if PyPDF2 available
                         try:
-                            from PyPDF2 import PdfReader
                             f.seek(0)
                             reader = PdfReader(f)
                             pages = len(reader.pages)
@@ -1571,7 +1578,6 @@ def render_stage_2_upload(navigator: StageNavigator, config: Dict):
                             thumb_b64 = None
                             pages = ''
                             try:
-                                from PyPDF2 import PdfReader
                                 if content is not None:
                                     reader = PdfReader(io.BytesIO(content))
                                 else:
@@ -1758,45 +1764,28 @@ def render_stage_3_classify(navigator: StageNavigator, config: Dict):
         api_key = st.session_state.get('anthropic_api_key')
         classifier = AIClassifier(api_key=api_key)
 
-        all_classifications = []
         total_files = len(files) + len(zip_files)
 
         progress_bar = st.progress(0)
         status_text = st.empty()
+        status_text.text(f"Classifying {total_files} documents...")
 
-        # Process uploaded files
+        # Read every document up front, then classify them all concurrently
+        items = []
         for i, file in enumerate(files):
-            status_text.text(f"Classifying: {file.name}")
-
-            # Read file content
             content = file.read()
             file.seek(0)  # Reset for later use
+            items.append((content, file.name, f"file_{i}"))
 
-            result = classifier.classify_document(
-                pdf_content=content,
-                filename=file.name,
-                visa_type=config['visa_type'],
-                document_id=f"file_{i}"
-            )
-            all_classifications.append(result)
-            progress_bar.progress((i + 1) / total_files)
-
-        # Process zip files
         for i, file_path in enumerate(zip_files):
-            filename = os.path.basename(file_path)
-            status_text.text(f"Classifying: {filename}")
-
             with open(file_path, 'rb') as f:
-                content = f.read()
+                items.append((f.read(), os.path.basename(file_path), f"zip_{i}"))
 
-            result = classifier.classify_document(
-                pdf_content=content,
-                filename=filename,
-                visa_type=config['visa_type'],
-                document_id=f"zip_{i}"
-            )
-            all_classifications.append(result)
-            progress_bar.progress((len(files) + i + 1) / total_files)
+        all_classifications = asyncio.run(classifier.classify_documents_batch(
+            items,
+            visa_type=config['visa_type'],
+            on_progress=lambda done, total: progress_bar.progress(done / total)
+        ))
 
         status_text.text("✓ Classification complete!")
         save_classifications(all_classifications)
@@ -1845,27 +1834,35 @@ def render_stage_5_generate(navigator: StageNavigator, config: Dict):
 
     processor = get_processor()
 
+    # Error / idle panel lives in a placeholder so it can be cleared once
+    # processing starts (progress then refreshes only inside its fragment)
+    start_panel = st.empty()
+
     # If a previous run failed, surface the error and allow retry
     if processor.has_error:
-        render_processing_ui()
-        state = processor.state
-        st.error(f"Generation failed: {state.error_message or 'Unknown error occurred during exhibit generation.'}")
-
-        if st.button("Retry Generate Exhibit Package", type="primary", use_container_width=True):
+        with start_panel.container():
+            render_processing_ui()
+            state = processor.state
+            st.error(f"Generation failed: {state.error_message or 'Unknown error occurred during exhibit generation.'}")
+
+            retry = st.button("Retry Generate Exhibit Package", type="primary", use_container_width=True)
+        if retry:
+            start_panel.empty()
             generate_exhibits_v2(config)
     
     elif not processor.is_running and not processor.is_complete:
         # Initial state: ready to start processing
-        st.info("Click below to generate your exhibit package")
-
-        if st.button("🚀 Generate Exhibit Package", type="primary", use_container_width=True):
-            # Start background processing and immediately rerun so the
-            # next render enters the `processor.is_running` branch and
-            # shows the progress UI.
+        with start_panel.container():
+            st.info("Click below to generate your exhibit package")
+
+            generate = st.button("🚀 Generate Exhibit Package", type="primary", use_container_width=True)
+        if generate:
+            # Start background processing; the `processor.is_running`
+            # branch below renders the progress UI in this same run.
+            start_panel.empty()
             generate_exhibits_v2(config)
-            st.rerun()
 
-    elif processor.is_running:
+    if processor.is_running:
         # Show progress
         result = render_processing_ui()
         if result:
@@ -2022,8 +2019,6 @@ def render_stage_6_complete(navigator: StageNavigator, config: Dict):
                         st.error("Please provide both a reason and the comparable evidence description.")
                     else:
                         try:
-                            from templates.docx_engine import generate_ce_letter
-
                             case_context = get_case_context()
                             case_data = {
                                 'beneficiary_name': getattr(case_context, 'beneficiary_name', None) or 'Beneficiary',
@@ -2056,7 +2051,6 @@ def render_stage_6_complete(navigator: StageNavigator, config: Dict):
 
                         except Exception as e:
                             st.error(f"Error generating CE letter: {e}")
-                            import traceback
                             traceback.print_exc()
 
             # Legal brief: if already generated, show download; otherwise offer Generate button
@@ -2075,8 +2069,6 @@ def render_stage_6_complete(navigator: StageNavigator, config: Dict):
             else:
                 if st.button("🖋️ Generate Legal Brief", type="secondary", use_container_width=True):
                     try:
-                        from templates.docx_engine import generate_legal_brief
-
                         case_context = get_case_context()
                         case_data = {
                             'beneficiary_name': getattr(case_context, 'beneficiary_name', None) or 'Beneficiary',
@@ -2125,7 +2117,6 @@ def render_stage_6_complete(navigator: StageNavigator, config: Dict):
 
                     except Exception as e:
                         st.error(f"Error generating legal brief: {e}")
-                        import traceback
                         traceback.print_exc()
 
         else:
@@ -2228,12 +2219,25 @@ def generate_exhibits_v2(config: Dict):
 
             # Step 3: Number exhibits
             proc.update_step("number", "running")
-            numbered_files = []
             exhibit_list = []
             # Initialize AI classifier for labels/analysis (uses Anthropic or OpenAI if available)
             api_key = st.session_state.get('anthropic_api_key')
             classifier = AIClassifier(api_key=api_key)
 
+            # Label + analyze all files concurrently instead of two serial calls per file
+            file_contents = []
+            for file_path in file_paths:
+                with open(file_path, 'rb') as _f:
+                    file_contents.append(_f.read())
+            try:
+                ai_results = asyncio.run(classifier.classify_batch([
+                    (content, os.path.basename(file_path), config['visa_type'])
+                    for content, file_path in zip(file_contents, file_paths)
+                ]))
+            except Exception as e:
+                print(f"Batched AI analysis error: {e}")
+                ai_results = [{} for _ in file_paths]
+
             for i, file_path in enumerate(file_paths):
                 # Get exhibit number
                 if config['numbering_style'] == "letters":
@@ -2251,16 +2255,10 @@ def generate_exhibits_v2(config: Dict):
                     'pages': get_pdf_page_count(file_path)
                 }
 
-                # Attempt AI-driven short label and content analysis BEFORE creating cover
-                short_label = None
-                analysis = None
+                # Apply AI-driven short label and content analysis BEFORE creating cover
                 try:
-                    with open(file_path, 'rb') as _f:
-                        content_bytes = _f.read()
-                    print(f'AI analyzing file: {os.path.basename(file_path)}')
-                    print(f'Visa type: {config.get("visa_type")}')
-                    short_label = classifier.generate_short_label(content_bytes, exhibit_info['filename'], config['visa_type'])
-                    analysis = classifier.analyze_pdf(content_bytes, exhibit_info['filename'], config['visa_type'])
+                    short_label = ai_results[i].get('short_label')
+                    analysis = ai_results[i].get('analysis')
                     if short_label:
                         exhibit_info['title'] = short_label
                     if analysis:
@@ -2275,7 +2273,20 @@ def generate_exhibits_v2(config: Dict):
                 except Exception as e:
                     print(f"AI analysis error for {file_path}: {e}")
 
-                # Add exhibit number with cover page, including title/summary when available
+                if i < len(compression_results):
+                    exhibit_info['compression'] = {
+                        'reduction': compression_results[i].get('reduction_percent', 0),
+                        'method': compression_results[i].get('method', 'none')
+                    }
+
+                exhibit_list.append(exhibit_info)
+                result['total_pages'] += exhibit_info['pages']
+
+            def stamp_one(i: int) -> str:
+                """Add exhibit number with cover page, including title/summary when available"""
+                file_path = file_paths[i]
+                exhibit_info = exhibit_list[i]
+                content_bytes = file_contents[i]
                 try:
                     # Provide extracted text and bytes so the PDF handler can append full text and images
                     # Only extract and attach full text/images if user enabled the option
@@ -2287,9 +2298,9 @@ def generate_exhibits_v2(config: Dict):
                     else:
                         extracted_text = None
 
-                    numbered_file = pdf_handler.add_exhibit_number_with_cover(
+                    return pdf_handler.add_exhibit_number_with_cover(
                         file_path,
-                        exhibit_num,
+                        exhibit_info['number'],
                         title=exhibit_info.get('title'),
                         summary=exhibit_info.get('summary'),
                         extracted_text=extracted_text,
@@ -2297,20 +2308,16 @@ def generate_exhibits_v2(config: Dict):
                     )
                 except Exception as e:
                     print(f"Error creating numbered file for {file_path}: {e}")
-                    numbered_file = pdf_handler.add_exhibit_number_with_cover(file_path, exhibit_num)
-
-                numbered_files.append(numbered_file)
-
-                if i < len(compression_results):
-                    exhibit_info['compression'] = {
-                        'reduction': compression_results[i].get('reduction_percent', 0),
-                        'method': compression_results[i].get('method', 'none')
-                    }
-
-                exhibit_list.append(exhibit_info)
-                result['total_pages'] += exhibit_info['pages']
+                    return pdf_handler.add_exhibit_number_with_cover(file_path, exhibit_info['number'])
 
-                proc.set_step_progress("number", (i + 1) / len(file_paths) * 100)
+            # Each exhibit is stamped independently (compression and OCR shell out),
+            # so run them side by side and keep the original order in numbered_files
+            numbered_files = [None] * len(file_paths)
+            with ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1)) as executor:
+                futures = {executor.submit(stamp_one, i): i for i in range(len(file_paths))}
+                for done, future in enumerate(as_completed(futures), 1):
+                    numbered_files[futures[future]] = future.result()
+                    proc.set_step_progress("number", done / len(file_paths) * 100)
 
             proc.complete_step("number")
 
@@ -2358,7 +2365,6 @@ def generate_exhibits_v2(config: Dict):
                     
                     # Generate cover letter
                     cover_letter_path = os.path.join(tmp_dir, "Cover_Letter.docx")
-                    from templates.docx_engine import CaseData
                     case_obj = CaseData(**case_data)
                     engine.generate_cover_letter(case_obj, exhibit_list, cover_letter_path)
                     result['cover_letter_path'] = cover_letter_path
@@ -2367,133 +2373,208 @@ def generate_exhibits_v2(config: Dict):
                     
                 except Exception as e:
                     print(f"Error generating cover letter: {e}")
-                    import traceback
                     traceback.print_exc()
                     result['cover_letter_path'] = None
             proc.complete_step("cover")
 
-            # Step 5a: Generate Filing Instructions (DIY) if requested
-            proc.update_step("filing_instructions", "running")
-            if config.get('add_filing_instructions'):
-                try:
-                    # Create template engine
-                    engine = DOCXTemplateEngine()
+            # The merge doesn't depend on the DOCX outputs, so start it now and
+            # build filing instructions while it runs
+            do_merge = config['merge_pdfs'] and len(numbered_files) > 1
+            merge_executor = ThreadPoolExecutor(max_workers=1) if do_merge else None
+            if merge_executor is not None:
+                output_file = os.path.join(tmp_dir, "final_package.pdf")
+                merge_future = merge_executor.submit(pdf_handler.merge_pdfs, numbered_files, output_file)
 
-                    # Reuse case context
-                    case_context = get_case_context()
-                    case_data = {
-                        'visa_type': config['visa_type'],
-                        'beneficiary_name': getattr(case_context, 'beneficiary_name', None) or 'Beneficiary',
-                        'petitioner_name': getattr(case_context, 'petitioner_name', None) or 'Petitioner',
-                        'service_center': getattr(case_context, 'service_center', None) or 'California Service Center',
-                        'nationality': getattr(case_context, 'nationality', None) or '',
-                        'job_title': getattr(case_context, 'job_title', None) or '',
-                        'field': getattr(case_context, 'field', None) or '',
-                        'duration': getattr(case_context, 'duration', None) or '3 years',
-                        'processing_type': getattr(case_context, 'processing_type', None) or 'Regular',
-                        'filing_fee': getattr(case_context, 'filing_fee', None) or '$460',
-                        'premium_fee': getattr(case_context, 'premium_fee', None) or '$2,805',
-                        'criteria_met': getattr(case_context, 'criteria_met', []) or []
-                    }
+            try:
+                # Step 5a: Generate Filing Instructions (DIY) if requested
+                proc.update_step("filing_instructions", "running")
+                if config.get('add_filing_instructions'):
+                    try:
+                        # Create template engine
+                        engine = DOCXTemplateEngine()
 
-                    from templates.docx_engine import CaseData
-                    case_obj = CaseData(**case_data)
-                    filing_path = os.path.join(tmp_dir, "Filing_Instructions.docx")
-                    engine.generate_filing_instructions(case_obj, exhibit_list, filing_path)
-                    result['filing_instructions_path'] = filing_path
+                        # Reuse case context
+                        case_context = get_case_context()
+                        case_data = {
+                            'visa_type': config['visa_type'],
+                            'beneficiary_name': getattr(case_context, 'beneficiary_name', None) or 'Beneficiary',
+                            'petitioner_name': getattr(case_context, 'petitioner_name', None) or 'Petitioner',
+                            'service_center': getattr(case_context, 'service_center', None) or 'California Service Center',
+                            'nationality': getattr(case_context, 'nationality', None) or '',
+                            'job_title': getattr(case_context, 'job_title', None) or '',
+                            'field': getattr(case_context, 'field', None) or '',
+                            'duration': getattr(case_context, 'duration', None) or '3 years',
+                            'processing_type': getattr(case_context, 'processing_type', None) or 'Regular',
+                            'filing_fee': getattr(case_context, 'filing_fee', None) or '$460',
+                            'premium_fee': getattr(case_context, 'premium_fee', None) or '$2,805',
+                            'criteria_met': getattr(case_context, 'criteria_met', []) or []
+                        }
 
-                except Exception as e:
-                    print(f"Error generating filing instructions: {e}")
-                    import traceback
-                    traceback.print_exc()
-                    result['filing_instructions_path'] = None
-            proc.complete_step("filing_instructions")
-
-            # Step 5: Merge / select output file
-            proc.update_step("merge", "running")
-
-            if numbered_files:
-                if config['merge_pdfs']:
-                    # Standard behavior: merge all numbered PDFs into one package
-                    output_file = os.path.join(tmp_dir, "final_package.pdf")
-                    merged_file = pdf_handler.merge_pdfs(numbered_files, output_file)
-
-                    # Copy to persistent location
-                    final_output = os.path.join(
-                        tempfile.gettempdir(),
-                        f"exhibit_package_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-                    )
-                    shutil.copy(merged_file, final_output)
-                    result['output_file'] = final_output
-                else:
-                    # If user chose not to merge, still provide a single downloadable file
-                    # by exposing the first numbered exhibit as the package output.
-                    first_file = numbered_files[0]
-                    final_output = os.path.join(
-                        tempfile.gettempdir(),
-                        f"exhibit_package_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-                    )
-                    shutil.copy(first_file, final_output)
-                    result['output_file'] = final_output
-            else:
-                # No numbered files were produced; leave output_file as None
-                result['output_file'] = None
+                        case_obj = CaseData(**case_data)
+                        filing_path = os.path.join(tmp_dir, "Filing_Instructions.docx")
+                        engine.generate_filing_instructions(case_obj, exhibit_list, filing_path)
+                        result['filing_instructions_path'] = filing_path
 
+                    except Exception as e:
+                        print(f"Error generating filing instructions: {e}")
+                        traceback.print_exc()
+                        result['filing_instructions_path'] = None
+                proc.complete_step("filing_instructions")
+
+                # Step 5: Merge / select output file
+                proc.update_step("merge", "running")
+
+                _stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+                if numbered_files:
+                    if do_merge:
+                        # Standard behavior: merge all numbered PDFs into one package
+                        merged_file = merge_future.result()
+
+                        # Copy to persistent location
+                        final_output = os.path.join(
+                            tempfile.gettempdir(),
+                            f"exhibit_package_{_stamp}.pdf"
+                        )
+                        # Same filesystem as tmp_dir, so this is a rename, not a copy
+                        publish_output_file(merged_file, final_output, move=True)
+                        result['output_file'] = final_output
+                    else:
+                        # Nothing to merge (single exhibit) or user chose not to merge: still
+                        # provide a single downloadable file by exposing the first numbered
+                        # exhibit as the package output.
+                        first_file = numbered_files[0]
+                        final_output = os.path.join(
+                            tempfile.gettempdir(),
+                            f"exhibit_package_{_stamp}.pdf"
+                        )
+                        publish_output_file(first_file, final_output)
+                        result['output_file'] = final_output
+                else:
+                    # No numbered files were produced; leave output_file as None
+                    result['output_file'] = None
+            finally:
+                if merge_executor is not None:
+                    # On error (including cancel) drop a queued merge and wait
+                    # out a running one so it doesn't outlive this run
+                    merge_executor.shutdown(wait=True, cancel_futures=True)
             proc.complete_step("merge")
 
             # Step 6: Finalize
             proc.update_step("finalize", "running")
 
-            # Save results to session state
-            st.session_state.exhibit_list = exhibit_list
-            
-            if compression_results:
-                avg_reduction = (
-                    (1 - result['compressed_size'] / max(result['original_size'], 1)) * 100
-                    if result['original_size'] > 0 else 0
-                )
-                st.session_state.compression_stats = {
+            # Save results to session state in a single write
+            final_state = {
+                'exhibit_list': exhibit_list,
+                'exhibits_generated': True,
+            }
+
+            # Only report compression stats when compression actually saved space
+            if compression_results and result['compressed_size'] < result['original_size']:
+                avg_reduction = (1 - result['compressed_size'] / result['original_size']) * 100
+                final_state['compression_stats'] = {
                     'original_size': result['original_size'],
                     'compressed_size': result['compressed_size'],
                     'avg_reduction': avg_reduction,
                     'method': compression_results[0].get('method', 'unknown'),
                     'quality': config['quality_preset']
                 }
+            else:
+                final_state['compression_stats'] = None
 
-            st.session_state.exhibits_generated = True
+            st.session_state.update(final_state)
             proc.complete_step("finalize")
             return result
 
         except Exception as e:
             raise RuntimeError(f"Failed to process exhibits: {e}") from e
 
-    processor.start_processing(process_func)
+    if not processor.start_processing(process_func):
+        st.warning("The previous run is still stopping. Please try again in a moment.")
+
+
+def publish_output_file(src: str, dest: str, move: bool = False) -> None:
+    """Expose src at dest without a byte-for-byte copy where possible.
+
+    Moves (move=True) or hard-links src to dest; falls back to shutil.copy
+    when src and dest are on different filesystems.
+    """
+    try:
+        if move:
+            os.replace(src, dest)
+        else:
+            os.link(src, dest)
+    except OSError:
+        shutil.copy(src, dest)
+
+
+@functools.lru_cache(maxsize=1024)
+def _page_count_cached(pdf_path: str, mtime_ns: int, size: int) -> int:
+    """Page count keyed on (path, mtime, size) so edited files are re-read"""
+    reader = PdfReader(pdf_path, strict=False)
+    try:
+        # Read /Count from the page-tree root instead of materializing every page
+        return int(reader.trailer['/Root']['/Pages']['/Count'])
+    except (KeyError, TypeError, ValueError):
+        return len(reader.pages)
 
 
 def get_pdf_page_count(pdf_path: str) -> int:
     """Get number of pages in PDF"""
     try:
-        from PyPDF2 import PdfReader
-        reader = PdfReader(pdf_path)
-        return len(reader.pages)
+        st_info = os.stat(pdf_path)
+        return _page_count_cached(pdf_path, st_info.st_mtime_ns, st_info.st_size)
     except:
         return 0
 
 
+_PAIRS = tuple(zip(
+    [1000, 900, 500, 400, 100, 90, 50, 40, 10, 9, 5, 4, 1],
+    ['M', 'CM', 'D', 'CD', 'C', 'XC', 'L', 'XL', 'X', 'IX', 'V', 'IV', 'I']
+))
+
+
+def _compute_roman(num: int) -> str:
+    """Convert number to Roman numeral (uncached)"""
+    if num <= 0:
+        return ''
+    parts = []
+    for value, symbol in _PAIRS:
+        count, num = divmod(num, value)
+        parts.append(symbol * count)
+    return ''.join(parts)
+
+
+# Precomputed once at import; exhibit numbering is a single dict lookup
+_ROMAN = {n: _compute_roman(n) for n in range(1, 4000)}
+
+
 def to_roman(num: int) -> str:
     """Convert number to Roman numeral"""
-    val = [1000, 900, 500, 400, 100, 90, 50, 40, 10, 9, 5, 4, 1]
-    syms = ['M', 'CM', 'D', 'CD', 'C', 'XC', 'L', 'XL', 'X', 'IX', 'V', 'IV', 'I']
-    roman_num = ''
-    i = 0
-    while num > 0:
-        for _ in range(num // val[i]):
-            roman_num += syms[i]
-            num -= val[i]
-        i += 1
+    roman_num = _ROMAN.get(num)
+    if roman_num is None:
+        roman_num = _compute_roman(num)
     return roman_num
 
 
+# Hides the JS-to-Python bridge input while keeping it interactive
+_BRIDGE_CSS = """
+<style>
+/* Robust hiding that keeps element interactive */
+div[data-testid="stTextInput"]:has(input[placeholder="bridge_connector_v2"]) {
+    opacity: 0;
+    height: 1px;
+    overflow: hidden;
+    position: absolute;
+    z-index: -1;
+}
+/* Fallback */
+input[placeholder="bridge_connector_v2"] {
+    opacity: 0;
+}
+</style>
+"""
+
+
 def main():
     """Main application entry point"""
     init_session_state()
@@ -2507,25 +2588,7 @@ def main():
         on_change=process_bridge_command,
         placeholder="bridge_connector_v2"
     )
-    st.markdown(
-        """
-        <style>
-        /* Robust hiding that keeps element interactive */
-        div[data-testid="stTextInput"]:has(input[placeholder="bridge_connector_v2"]) {
-            opacity: 0;
-            height: 1px;
-            overflow: hidden;
-            position: absolute;
-            z-index: -1;
-        }
-        /* Fallback */
-        input[placeholder="bridge_connector_v2"] {
-            opacity: 0;
-        }
-        </style>
-        """, 
-        unsafe_allow_html=True
-    )
+    st.markdown(_BRIDGE_CSS, unsafe_allow_html=True)
 
     # Header
     st.markdown('<div class="main-header">📄 Visa Exhibit Generator <span class="version-badge">V2.0</span></div>', unsafe_allow_html=True)
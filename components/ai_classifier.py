@@ -11,14 +11,272 @@ AI-powered document classification using Claude API.
 
 import streamlit as st
 from dataclasses import dataclass, field
-from typing import List, Optional, Dict, Any, Tuple
+from typing import List, Optional, Dict, Any, Tuple, Set, Iterable
 import os
 import io
 import json
 import re
-
-
-@dataclass
+import asyncio
+import atexit
+import hashlib
+import functools
+import importlib.util
+import tempfile
+import threading
+import traceback
+from collections import OrderedDict
+from PyPDF2 import PdfReader
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import diskcache
+    DISKCACHE_AVAILABLE = True
+except ImportError:
+    DISKCACHE_AVAILABLE = False
+
+try:
+    from pdf2image import convert_from_bytes
+    import pytesseract
+    OCR_AVAILABLE = True
+except ImportError:
+    OCR_AVAILABLE = False
+
+try:
+    import pypdfium2 as pdfium
+    PDFIUM_AVAILABLE = True
+except ImportError:
+    PDFIUM_AVAILABLE = False
+
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
+
+try:
+    import ahocorasick
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    AHOCORASICK_AVAILABLE = False
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+# Checked without importing: sentence-transformers pulls in torch, so it is
+# only loaded by _get_semantic_cache on first use
+SEMANTIC_CACHE_AVAILABLE = NUMPY_AVAILABLE and importlib.util.find_spec('sentence_transformers') is not None
+
+# Max in-flight requests when labelling/analysing a batch of documents
+BATCH_MAX_CONNECTIONS = 16
+
+# Max concurrent classification requests in classify_documents_batch
+CLASSIFY_MAX_CONCURRENCY = 20
+
+# SDK retries per request (exponential backoff with jitter, honouring
+# retry-after on 429/529)
+CLASSIFY_MAX_RETRIES = 5
+
+# Skip the AI call when filename + opening text match this many distinct
+# keywords of one criterion, with at least FAST_PATH_MIN_GAP over the next
+FAST_PATH_CHARS = 200
+FAST_PATH_MIN_SCORE = 3
+FAST_PATH_MIN_GAP = 2
+FAST_PATH_REASONING = "fast-path: strong keyword signature"
+
+# Document text sent to the models is trimmed to a token budget rather than
+# a character count, so prefill cost is bounded regardless of text density
+PROMPT_TOKEN_BUDGET = 1200
+LABEL_TOKEN_BUDGET = 600
+
+# Scanned PDFs: only the first pages are rasterized and OCR'd
+OCR_MAX_PAGES = 10
+
+# Pages with less embedded text than this are treated as scanned
+OCR_MIN_PAGE_CHARS = 30
+
+# Extracted text is memoized per PDF (by sha256) at no less than this length,
+# so label/analysis/classification calls on the same bytes share one parse
+EXTRACTION_CACHE_CHARS = 8000
+EXTRACTION_CACHE_SIZE = 256
+_extraction_cache: "OrderedDict[str, Tuple[int, str]]" = OrderedDict()
+_extraction_cache_lock = threading.Lock()
+
+# PDFium is not thread-safe, even across documents, and pypdfium2 adds no
+# locking; every pdfium call goes through this lock
+_pdfium_lock = threading.Lock()
+
+# Bump when prompts change so cached AI results from older prompts are ignored
+PROMPT_VERSION = 1
+AI_CACHE_DIR = os.getenv('AI_CACHE_DIR', '.ai_cache')
+
+
+@functools.lru_cache(maxsize=4)
+def _anthropic_client(api_key: str) -> Any:
+    """Anthropic client per API key, created once and reused across reruns (None if not installed)"""
+    try:
+        import anthropic
+    except ImportError:
+        return None
+    return anthropic.Anthropic(api_key=api_key, max_retries=CLASSIFY_MAX_RETRIES)
+
+
+@functools.lru_cache(maxsize=4)
+def _openai_client(api_key: Optional[str]) -> Any:
+    """openai module configured for api_key, imported once (None if no key or not installed)"""
+    if not api_key:
+        return None
+    try:
+        import openai
+    except ImportError:
+        return None
+    openai.api_key = api_key
+    return openai
+
+
+@functools.lru_cache(maxsize=1)
+def _get_disk_cache():
+    """Open the shared on-disk AI result cache once per process (None if unavailable)"""
+    if not DISKCACHE_AVAILABLE:
+        return None
+    try:
+        return diskcache.Cache(AI_CACHE_DIR)
+    except Exception as e:
+        print(f"AI result cache unavailable: {e}")
+        return None
+
+
+# Near-duplicate documents (same letter template, re-scanned certificate) reuse
+# a past classification when their text embeddings are this similar
+SEMANTIC_CACHE_MODEL = 'sentence-transformers/all-MiniLM-L6-v2'
+SEMANTIC_CACHE_THRESHOLD = 0.93
+SEMANTIC_CACHE_MIN_CHARS = 200
+
+
+class SemanticCache:
+    """Embedding-similarity cache of classification results, one matrix per visa type.
+
+    New entries are kept in memory and written to disk by flush(), which
+    callers run once per batch (and atexit) rather than on every add.
+    """
+
+    def __init__(self, model: Any, path: str):
+        self.model = model
+        self.path = path
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        # Per visa type: row-major matrix with spare capacity, and rows used
+        self._vectors: Dict[str, Any] = {}
+        self._counts: Dict[str, int] = {}
+        self._results: Dict[str, List[Dict[str, Any]]] = {}
+        self._dirty = False
+        self._load()
+        atexit.register(self.flush)
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with np.load(self.path) as data:
+                self._results = json.loads(str(data['results_json']))
+                for visa_type in self._results:
+                    self._vectors[visa_type] = data[f"vectors_{visa_type}"]
+                    self._counts[visa_type] = len(self._vectors[visa_type])
+        except Exception as e:
+            print(f"Semantic cache load failed: {e}")
+            self._vectors, self._counts, self._results = {}, {}, {}
+
+    def flush(self):
+        """Write the cache to disk if it changed, replacing the file atomically"""
+        with self._save_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                arrays = {
+                    f"vectors_{vt}": mat[:self._counts[vt]]
+                    for vt, mat in self._vectors.items()
+                }
+                results_json = json.dumps(self._results)
+                self._dirty = False
+
+            tmp_path = None
+            try:
+                directory = os.path.dirname(self.path) or '.'
+                os.makedirs(directory, exist_ok=True)
+                with tempfile.NamedTemporaryFile(
+                    dir=directory, suffix='.npz.tmp', delete=False
+                ) as f:
+                    tmp_path = f.name
+                    np.savez(f, results_json=np.array(results_json), **arrays)
+                os.replace(tmp_path, self.path)
+            except Exception as e:
+                print(f"Semantic cache save failed: {e}")
+                if tmp_path and os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                with self._lock:
+                    self._dirty = True
+
+    def embed(self, text: str) -> Any:
+        """Normalized embedding of the document's opening text (None if too short)"""
+        if len(text.strip()) < SEMANTIC_CACHE_MIN_CHARS or text.startswith('[PDF text extraction failed'):
+            return None
+        return self.model.encode(text[:1024], normalize_embeddings=True)
+
+    def lookup(self, visa_type: str, embedding: Any) -> Optional[Dict[str, Any]]:
+        """Return the cached result most similar to embedding, if above threshold"""
+        with self._lock:
+            count = self._counts.get(visa_type, 0)
+            if not count:
+                return None
+            sims = self._vectors[visa_type][:count] @ embedding
+            best = int(sims.argmax())
+            if sims[best] >= SEMANTIC_CACHE_THRESHOLD:
+                return self._results[visa_type][best]
+        return None
+
+    def add(self, visa_type: str, embedding: Any, result: Dict[str, Any]):
+        """Append an entry in memory (amortized O(1)); flush() persists it"""
+        with self._lock:
+            row = embedding.astype(np.float32).ravel()
+            matrix = self._vectors.get(visa_type)
+            count = self._counts.get(visa_type, 0)
+            if matrix is None or count == len(matrix):
+                # Grow by doubling so appends don't copy the matrix each time
+                grown = np.empty((max(16, 2 * count), row.shape[0]), dtype=np.float32)
+                if count:
+                    grown[:count] = matrix[:count]
+                matrix = self._vectors[visa_type] = grown
+            matrix[count] = row
+            self._counts[visa_type] = count + 1
+            self._results.setdefault(visa_type, []).append(result)
+            self._dirty = True
+
+
+def _flush_semantic_cache():
+    """Persist new semantic cache entries, if the cache has been loaded"""
+    if _get_semantic_cache.cache_info().currsize:
+        semantic = _get_semantic_cache()
+        if semantic is not None:
+            semantic.flush()
+
+
+@functools.lru_cache(maxsize=1)
+def _get_semantic_cache() -> Optional[SemanticCache]:
+    """Load the embedding model and semantic cache once per process (None if unavailable)"""
+    if not SEMANTIC_CACHE_AVAILABLE:
+        return None
+    try:
+        from sentence_transformers import SentenceTransformer
+        model = SentenceTransformer(SEMANTIC_CACHE_MODEL)
+    except Exception as e:
+        print(f"Semantic cache model unavailable: {e}")
+        return None
+    return SemanticCache(model, os.path.join(AI_CACHE_DIR, 'semantic_cache.npz'))
+
+
+@dataclass(slots=True)
 class ClassificationResult:
     """Result of AI document classification"""
     document_id: str
@@ -106,6 +364,188 @@ DOCUMENT_TYPES = {
     'brief': ['brief', 'petition', 'letter', 'support', 'cover'],
 }
 
+# Per-visa-type lookups precomputed once instead of on every classification
+_CRITERIA_DESC = {
+    vt: "\n".join(f"- {code}: {info['name']}" for code, info in criteria.items())
+    for vt, criteria in VISA_CRITERIA.items()
+}
+_CRIT_KEYS = {vt: list(criteria.keys()) for vt, criteria in VISA_CRITERIA.items()}
+_CRIT_INDEX = {vt: {code: k for k, code in enumerate(keys)} for vt, keys in _CRIT_KEYS.items()}
+_LETTER = [chr(65 + i) for i in range(26)]
+
+# Every criteria and document-type keyword, scanned for in one pass per document
+ALL_KEYWORDS = frozenset(
+    [kw for criteria in VISA_CRITERIA.values() for info in criteria.values() for kw in info['keywords']]
+    + [kw for kws in DOCUMENT_TYPES.values() for kw in kws]
+)
+
+
+def _build_keyword_automaton():
+    automaton = ahocorasick.Automaton()
+    for kw in ALL_KEYWORDS:
+        automaton.add_word(kw, kw)
+    automaton.make_automaton()
+    return automaton
+
+
+KEYWORD_AUTOMATON = _build_keyword_automaton() if AHOCORASICK_AVAILABLE else None
+
+# Regex fallback: a zero-width lookahead tries the longest keyword at every
+# position; shorter keywords that are substrings of a hit are implied by it
+_KEYWORD_RE = re.compile(
+    "(?=(" + "|".join(re.escape(kw) for kw in sorted(ALL_KEYWORDS, key=len, reverse=True)) + "))"
+)
+_KEYWORD_IMPLIES = {
+    kw: frozenset(other for other in ALL_KEYWORDS if other in kw) for kw in ALL_KEYWORDS
+}
+
+
+def _present_keywords(text_lower: str) -> Set[str]:
+    """Return the keywords that occur (as substrings) in text_lower"""
+    if KEYWORD_AUTOMATON is not None:
+        return {kw for _, kw in KEYWORD_AUTOMATON.iter(text_lower)}
+    present = set()
+    for hit in set(_KEYWORD_RE.findall(text_lower)):
+        present |= _KEYWORD_IMPLIES[hit]
+    return present
+
+
+# Heuristic analysis scanner; full dates are tried before bare years so a
+# date is reported once rather than also as its year
+_MONTHS = r"(?:January|February|March|April|May|June|July|August|September|October|November|December)"
+_ANALYZE_RE = re.compile(
+    r"(?P<monthdate>" + _MONTHS + r" \d{1,2},? \d{4})"
+    r"|(?P<numdate>\b\d{1,2}[/-]\d{1,2}[/-]\d{2,4}\b)"
+    r"|\b(?P<form>I-129|I-907|G-1450|I-485|DS-160)\b"
+    r"|\b(?P<visa>O-1A|O-1B|P-1A|P-1B|F-1|H-1B|EB-1A|EB-1B|EB-2)\b"
+    r"|(?P<year>\b\d{4}\b)",
+    re.IGNORECASE
+)
+
+
+def _build_keyword_codes(criteria: Dict[str, Dict[str, Any]]) -> Dict[str, Tuple[str, ...]]:
+    """Map each keyword to the criterion codes it counts towards"""
+    codes_by_kw: Dict[str, List[str]] = {}
+    for code, info in criteria.items():
+        for kw in info['keywords']:
+            codes_by_kw.setdefault(kw, []).append(code)
+    return {kw: tuple(codes) for kw, codes in codes_by_kw.items()}
+
+
+# Built once per visa type so scoring a document walks only its matched
+# keywords instead of every criterion's keyword list
+_KEYWORD_CODES = {vt: _build_keyword_codes(criteria) for vt, criteria in VISA_CRITERIA.items()}
+
+
+def _score_criteria(criteria_key: str, present: Set[str]) -> Dict[str, int]:
+    """Distinct matched keywords per criterion code, in VISA_CRITERIA order"""
+    scores = dict.fromkeys(_CRIT_KEYS[criteria_key], 0)
+    keyword_codes = _KEYWORD_CODES[criteria_key]
+    for kw in present:
+        for code in keyword_codes.get(kw, ()):
+            scores[code] += 1
+    return scores
+
+
+def _detect_document_type(present: Set[str]) -> Optional[str]:
+    """First DOCUMENT_TYPES entry (in priority order) with a keyword in present"""
+    for dtype, keywords in DOCUMENT_TYPES.items():
+        if any(kw in present for kw in keywords):
+            return dtype
+    return None
+
+
+def _build_rule_matrix(criteria: Dict[str, Dict[str, Any]]) -> Tuple[Dict[str, int], Any]:
+    """Keyword column index and (keywords x criteria) indicator matrix for batch scoring"""
+    kw_index: Dict[str, int] = {}
+    for info in criteria.values():
+        for kw in info['keywords']:
+            kw_index.setdefault(kw, len(kw_index))
+    indicator = np.zeros((len(kw_index), len(criteria)), dtype=np.float32)
+    for c, info in enumerate(criteria.values()):
+        for kw in info['keywords']:
+            indicator[kw_index[kw], c] += 1
+    return kw_index, indicator
+
+
+_RULE_MATRICES = (
+    {vt: _build_rule_matrix(criteria) for vt, criteria in VISA_CRITERIA.items()}
+    if NUMPY_AVAILABLE else {}
+)
+
+
+@functools.lru_cache(maxsize=1)
+def _token_encoding() -> Any:
+    """tiktoken encoding used to approximate prompt token counts (None if unavailable)"""
+    if not TIKTOKEN_AVAILABLE:
+        return None
+    try:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None
+
+
+def _trim_to_tokens(text: str, max_tokens: int) -> str:
+    """Trim text to at most max_tokens tokens (about 3.3 chars/token without tiktoken)"""
+    encoding = _token_encoding()
+    if encoding is None:
+        return text[:max_tokens * 10 // 3]
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens])
+
+
+def _read_until_json_closes(chunks: Iterable[str]) -> str:
+    """Accumulate streamed text, stopping once the first top-level JSON object closes"""
+    buf = []
+    depth = 0
+    in_string = escaped = False
+    for chunk in chunks:
+        buf.append(chunk)
+        for ch in chunk:
+            if in_string:
+                if escaped:
+                    escaped = False
+                elif ch == '\\':
+                    escaped = True
+                elif ch == '"':
+                    in_string = False
+            elif ch == '"':
+                in_string = True
+            elif ch == '{':
+                depth += 1
+            elif ch == '}' and depth:
+                depth -= 1
+                if depth == 0:
+                    return "".join(buf)
+    return "".join(buf)
+
+
+def _ocr_page(image: Any) -> Optional[str]:
+    """OCR a single page image (None if tesseract fails on it)"""
+    try:
+        return pytesseract.image_to_string(image)
+    except Exception:
+        return None
+
+
+def _ocr_pdf_page(pdf_content: bytes, page_number: int) -> Optional[str]:
+    """Rasterize and OCR one 1-based page of a PDF (None on failure)"""
+    try:
+        images = convert_from_bytes(pdf_content, first_page=page_number, last_page=page_number, dpi=150)
+    except Exception:
+        return None
+    return _ocr_page(images[0]) if images else None
+
+
+def _map_parallel(func: Any, items: List[Any]) -> List[Any]:
+    """Map func over items on a thread pool (tesseract/poppler run as subprocesses)"""
+    if not items:
+        return []
+    with ThreadPoolExecutor(max_workers=min(len(items), os.cpu_count() or 1)) as executor:
+        return list(executor.map(func, items))
+
 
 class AIClassifier:
     """AI-powered document classifier"""
@@ -115,50 +555,122 @@ class AIClassifier:
         self.api_key = api_key or os.getenv('ANTHROPIC_API_KEY')
         self.model = model
         self.client = None
+        self._cache = _get_disk_cache()
 
         if self.api_key:
-            try:
-                import anthropic
-                self.client = anthropic.Anthropic(api_key=self.api_key)
-            except ImportError:
+            self.client = _anthropic_client(self.api_key)
+            if self.client is None:
                 st.warning("Anthropic package not installed. Using rule-based classification.")
 
+    def _cache_key(self, kind: str, pdf_content: bytes, visa_type: str) -> Optional[str]:
+        """Content-addressed cache key, or None when caching is disabled"""
+        if self._cache is None:
+            return None
+        digest = hashlib.sha256(pdf_content).hexdigest()
+        return f"{kind}:{PROMPT_VERSION}:{self.model}:{visa_type}:{digest}"
+
+    def _cache_get(self, key: Optional[str]) -> Any:
+        if key is None:
+            return None
+        try:
+            return self._cache.get(key)
+        except Exception:
+            return None
+
+    def _cache_set(self, key: Optional[str], value: Any):
+        if key is None:
+            return
+        try:
+            self._cache.set(key, value)
+        except Exception as e:
+            print(f"AI result cache write failed: {e}")
+
     def extract_text_from_pdf(self, pdf_content: bytes, max_chars: int = 4000) -> str:
-        """Extract text from PDF for classification"""
+        """Extract text from PDF for classification (memoized by content hash)"""
+        digest = hashlib.sha256(pdf_content).hexdigest()
+        with _extraction_cache_lock:
+            hit = _extraction_cache.get(digest)
+            if hit and hit[0] >= max_chars:
+                _extraction_cache.move_to_end(digest)
+                return hit[1][:max_chars]
+
+        limit = max(max_chars, EXTRACTION_CACHE_CHARS)
+        text = self._extract_text_uncached(pdf_content, limit)
+        if not text.startswith('[PDF text extraction failed'):
+            with _extraction_cache_lock:
+                _extraction_cache[digest] = (limit, text)
+                _extraction_cache.move_to_end(digest)
+                while len(_extraction_cache) > EXTRACTION_CACHE_SIZE:
+                    _extraction_cache.popitem(last=False)
+        return text[:max_chars]
+
+    def _extract_text_uncached(self, pdf_content: bytes, max_chars: int) -> str:
+        """Extract up to max_chars of text, falling back to OCR for scanned pages"""
         try:
-            from PyPDF2 import PdfReader
-            reader = PdfReader(io.BytesIO(pdf_content))
-            text = ""
-            for page in reader.pages[:5]:  # First 5 pages
-                page_text = page.extract_text() or ""
-                text += page_text + "\n"
-
-            # If extracted text is empty or clearly a scanned placeholder, try OCR fallback
-            cleaned = (text or "").strip()
-            if (not cleaned) or len(cleaned) < 30 or 'adobe scan' in cleaned.lower():
-                # Attempt OCR using pdf2image + pytesseract if available
-                try:
-                    from pdf2image import convert_from_bytes
-                    import pytesseract
-                    images = convert_from_bytes(pdf_content)
-                    ocr_text_parts = []
-                    for img in images[:10]:
-                        try:
-                            ocr_page = pytesseract.image_to_string(img)
-                            ocr_text_parts.append(ocr_page)
-                        except Exception:
-                            continue
-                    ocr_text = "\n\n".join(ocr_text_parts)
-                    if ocr_text.strip():
-                        return ocr_text[:max_chars]
-                except Exception:
-                    # OCR not available or failed; fall back to whatever we have
-                    pass
+            pages = self._extract_text_layer(pdf_content, max_chars)
+            text = "".join(page_text + "\n" for page_text in pages)
+
+            # If extracted text is empty or clearly a scanned placeholder, OCR the document
+            cleaned = text.strip()
+            if (not cleaned) or len(cleaned) < OCR_MIN_PAGE_CHARS or 'adobe scan' in cleaned.lower():
+                if OCR_AVAILABLE:
+                    try:
+                        images = convert_from_bytes(
+                            pdf_content, first_page=1, last_page=OCR_MAX_PAGES, thread_count=4
+                        )
+                        ocr_text = "\n\n".join(part for part in _map_parallel(_ocr_page, images) if part is not None)
+                        if ocr_text.strip():
+                            return ocr_text[:max_chars]
+                    except Exception:
+                        # OCR failed; fall back to whatever we have
+                        pass
+                return text[:max_chars]
+
+            # Otherwise rasterize and OCR only the individual pages without a text layer
+            sparse = [i for i, page_text in enumerate(pages) if len(page_text.strip()) < OCR_MIN_PAGE_CHARS]
+            if sparse and OCR_AVAILABLE:
+                ocr_parts = _map_parallel(lambda i: _ocr_pdf_page(pdf_content, i + 1), sparse)
+                for i, ocr_text in zip(sparse, ocr_parts):
+                    if ocr_text and ocr_text.strip():
+                        pages[i] = ocr_text
+                text = "".join(page_text + "\n" for page_text in pages)
 
             return text[:max_chars]
         except Exception as e:
             return f"[PDF text extraction failed: {e}]"
 
+    def _extract_text_layer(self, pdf_content: bytes, max_chars: int, max_pages: int = 5) -> List[str]:
+        """Read embedded text page by page, stopping once max_chars is reached"""
+        pages = []
+        total = 0
+
+        if PDFIUM_AVAILABLE:
+            with _pdfium_lock:
+                pdf = pdfium.PdfDocument(pdf_content)
+                try:
+                    for i in range(min(max_pages, len(pdf))):
+                        page = pdf[i]
+                        textpage = page.get_textpage()
+                        page_text = textpage.get_text_range()
+                        textpage.close()
+                        page.close()
+                        pages.append(page_text)
+                        total += len(page_text) + 1
+                        if total >= max_chars:
+                            break
+                finally:
+                    pdf.close()
+            return pages
+
+        reader = PdfReader(io.BytesIO(pdf_content))
+        for page in reader.pages[:max_pages]:
+            page_text = page.extract_text() or ""
+            pages.append(page_text)
+            total += len(page_text) + 1
+            if total >= max_chars:
+                break
+        return pages
+
     def classify_document(
         self,
         pdf_content: bytes,
@@ -167,30 +679,201 @@ class AIClassifier:
         document_id: str = ""
     ) -> ClassificationResult:
         """Classify a document"""
+        cache_key = self._cache_key('classify', pdf_content, visa_type) if self.client else None
+        cached = self._cache_get(cache_key)
+        if cached:
+            return ClassificationResult(**{**cached, 'document_id': document_id, 'filename': filename})
+
         extracted_text = self.extract_text_from_pdf(pdf_content)
 
         if self.client:
-            return self._classify_with_ai(extracted_text, filename, visa_type, document_id)
+            fast = self._fast_path_classify(extracted_text, filename, visa_type, document_id)
+            if fast:
+                return fast
+
+            semantic = _get_semantic_cache()
+            embedding = semantic.embed(extracted_text) if semantic else None
+            if embedding is not None:
+                near = semantic.lookup(visa_type, embedding)
+                if near:
+                    return ClassificationResult(**{**near, 'document_id': document_id, 'filename': filename})
+            return self._classify_with_ai(
+                extracted_text, filename, visa_type, document_id, cache_key, embedding
+            )
         else:
             return self._classify_with_rules(extracted_text, filename, visa_type, document_id)
 
+    def _fast_path_classify(
+        self,
+        text: str,
+        filename: str,
+        visa_type: str,
+        document_id: str
+    ) -> Optional[ClassificationResult]:
+        """Rule-based result for documents with an unambiguous keyword signature, else None.
+
+        Only the filename and the opening of the text are scanned; the top
+        criterion must reach FAST_PATH_MIN_SCORE and lead the runner-up by
+        FAST_PATH_MIN_GAP distinct keywords.
+        """
+        criteria_key = visa_type if visa_type in VISA_CRITERIA else 'O-1A'
+        present = _present_keywords((filename + " " + text[:FAST_PATH_CHARS]).lower())
+        ranked = sorted(
+            ((score, code) for code, score in _score_criteria(criteria_key, present).items()),
+            reverse=True
+        )
+        best_score, best_code = ranked[0]
+        runner_up = ranked[1][0] if len(ranked) > 1 else 0
+        if best_score < FAST_PATH_MIN_SCORE or best_score - runner_up < FAST_PATH_MIN_GAP:
+            return None
+
+        result = self._rules_result(
+            filename, visa_type, document_id, criteria_key, best_code, best_score, present
+        )
+        result.confidence_score = 0.9
+        result.reasoning = FAST_PATH_REASONING
+        return result
+
     def _classify_with_ai(
         self,
         text: str,
         filename: str,
         visa_type: str,
+        document_id: str,
+        cache_key: Optional[str] = None,
+        embedding: Any = None
+    ) -> ClassificationResult:
+        """Classify using Claude API (successful results are cached by key and embedding)"""
+        prompt = self._build_classification_prompt(text, filename, visa_type)
+
+        try:
+            response = self.client.messages.create(
+                model=self.model,
+                max_tokens=1024,
+                messages=[{"role": "user", "content": prompt}]
+            )
+
+            return self._classification_from_response(
+                response.content[0].text, filename, visa_type, document_id, cache_key, embedding
+            )
+        except Exception as e:
+            st.warning(f"AI classification failed: {e}. Using rule-based fallback.")
+            return self._classify_with_rules(text, filename, visa_type, document_id)
+
+    async def classify_documents_batch(
+        self,
+        items: List[Tuple[bytes, str, str]],
+        visa_type: str,
+        on_progress: Optional[callable] = None
+    ) -> List[ClassificationResult]:
+        """Classify many documents concurrently.
+
+        Args:
+            items: List of (pdf_content, filename, document_id) tuples
+            visa_type: Visa type shared by all documents
+            on_progress: Optional callback(completed, total) as documents finish
+
+        Returns:
+            List of ClassificationResult in input order
+        """
+        if not items:
+            return []
+
+        async_client = self._make_async_client() if self.client else None
+        semaphore = asyncio.Semaphore(CLASSIFY_MAX_CONCURRENCY)
+        completed = 0
+
+        async def run_one(item: Tuple[bytes, str, str]) -> ClassificationResult:
+            nonlocal completed
+            pdf_content, filename, document_id = item
+            if self.client is None:
+                # Rule-based: only extract here, score the whole batch at once below
+                result = await asyncio.to_thread(self.extract_text_from_pdf, pdf_content)
+            elif async_client is None:
+                result = await asyncio.to_thread(
+                    self.classify_document, pdf_content, filename, visa_type, document_id
+                )
+            else:
+                async with semaphore:
+                    result = await self._classify_document_async(
+                        async_client, pdf_content, filename, visa_type, document_id
+                    )
+            completed += 1
+            if on_progress:
+                on_progress(completed, len(items))
+            return result
+
+        try:
+            results = list(await asyncio.gather(*(run_one(item) for item in items)))
+        finally:
+            if async_client is not None:
+                await async_client.close()
+            # Write new semantic cache entries once, off the event loop
+            await asyncio.to_thread(_flush_semantic_cache)
+
+        if self.client is None:
+            filenames = [filename for _, filename, _ in items]
+            document_ids = [document_id for _, _, document_id in items]
+            return self._classify_with_rules_batch(results, filenames, visa_type, document_ids)
+
+        # Counted here, on the calling (script) thread, for tuning the
+        # FAST_PATH_* thresholds
+        hits = sum(result.reasoning == FAST_PATH_REASONING for result in results)
+        st.session_state['_fast_path_hits'] = st.session_state.get('_fast_path_hits', 0) + hits
+        print(f"Fast path classified {hits}/{len(results)} documents without an AI call")
+        return results
+
+    async def _classify_document_async(
+        self,
+        async_client: Any,
+        pdf_content: bytes,
+        filename: str,
+        visa_type: str,
         document_id: str
     ) -> ClassificationResult:
-        """Classify using Claude API"""
-        criteria = VISA_CRITERIA.get(visa_type, VISA_CRITERIA['O-1A'])
-        criteria_desc = "\n".join([f"- {code}: {info['name']}" for code, info in criteria.items()])
+        """Async counterpart of classify_document for an AsyncAnthropic client"""
+        cache_key = self._cache_key('classify', pdf_content, visa_type)
+        cached = self._cache_get(cache_key)
+        if cached:
+            return ClassificationResult(**{**cached, 'document_id': document_id, 'filename': filename})
+
+        text = await asyncio.to_thread(self.extract_text_from_pdf, pdf_content)
+
+        fast = self._fast_path_classify(text, filename, visa_type, document_id)
+        if fast:
+            return fast
+
+        semantic = _get_semantic_cache()
+        embedding = await asyncio.to_thread(semantic.embed, text) if semantic else None
+        if embedding is not None:
+            near = semantic.lookup(visa_type, embedding)
+            if near:
+                return ClassificationResult(**{**near, 'document_id': document_id, 'filename': filename})
+
+        prompt = self._build_classification_prompt(text, filename, visa_type)
+        try:
+            response = await async_client.messages.create(
+                model=self.model,
+                max_tokens=1024,
+                messages=[{"role": "user", "content": prompt}]
+            )
+            return self._classification_from_response(
+                response.content[0].text, filename, visa_type, document_id, cache_key, embedding
+            )
+        except Exception as e:
+            print(f"AI classification failed for {filename}: {e}. Using rule-based fallback.")
+            return self._classify_with_rules(text, filename, visa_type, document_id)
+
+    def _build_classification_prompt(self, text: str, filename: str, visa_type: str) -> str:
+        """Build the Claude classification prompt for one document"""
+        criteria_desc = _CRITERIA_DESC.get(visa_type, _CRITERIA_DESC['O-1A'])
 
-        prompt = f"""You are an expert immigration attorney assistant. Analyze this document for a {visa_type} visa petition.
+        return f"""You are an expert immigration attorney assistant. Analyze this document for a {visa_type} visa petition.
 
 DOCUMENT FILENAME: {filename}
 
-EXTRACTED TEXT (first 4000 chars):
-{text}
+EXTRACTED TEXT (opening of the document):
+{_trim_to_tokens(text, PROMPT_TOKEN_BUDGET)}
 
 VISA TYPE: {visa_type}
 
@@ -216,53 +899,59 @@ IMPORTANT:
 - Be specific about document type
 - Provide reasoning"""
 
-        try:
-            response = self.client.messages.create(
-                model=self.model,
-                max_tokens=1024,
-                messages=[{"role": "user", "content": prompt}]
-            )
+    def _classification_from_response(
+        self,
+        result_text: str,
+        filename: str,
+        visa_type: str,
+        document_id: str,
+        cache_key: Optional[str] = None,
+        embedding: Any = None
+    ) -> ClassificationResult:
+        """Build a ClassificationResult from Claude's JSON reply and cache it"""
+        result = self._parse_json_response(result_text)
 
-            result_text = response.content[0].text
-            result = self._parse_json_response(result_text)
-
-            return ClassificationResult(
-                document_id=document_id,
-                filename=filename,
-                criterion_code=result.get('criterion_code', 'UNKNOWN'),
-                criterion_name=result.get('criterion_name', 'Unknown'),
-                document_type=result.get('document_type', 'other'),
-                confidence_score=float(result.get('confidence_score', 0.5)),
-                reasoning=result.get('reasoning', ''),
-                suggested_exhibit_letter=result.get('suggested_exhibit_letter', 'Z'),
-                evidence_type=result.get('evidence_type'),
-                alternative_classifications=result.get('alternative_classifications', [])
-            )
-        except Exception as e:
-            st.warning(f"AI classification failed: {e}. Using rule-based fallback.")
-            return self._classify_with_rules(text, filename, visa_type, document_id)
+        classification = ClassificationResult(
+            document_id=document_id,
+            filename=filename,
+            criterion_code=result.get('criterion_code', 'UNKNOWN'),
+            criterion_name=result.get('criterion_name', 'Unknown'),
+            document_type=result.get('document_type', 'other'),
+            confidence_score=float(result.get('confidence_score', 0.5)),
+            reasoning=result.get('reasoning', ''),
+            suggested_exhibit_letter=result.get('suggested_exhibit_letter', 'Z'),
+            evidence_type=result.get('evidence_type'),
+            alternative_classifications=result.get('alternative_classifications', [])
+        )
+        # Unparseable or off-list replies are returned but not cached, so one
+        # bad response doesn't stick to the document or its near-duplicates
+        parsed = result.get('criterion_code') in VISA_CRITERIA.get(visa_type, {})
+        if parsed:
+            self._cache_set(cache_key, classification.to_dict())
+            if embedding is not None:
+                _get_semantic_cache().add(visa_type, embedding, classification.to_dict())
+        return classification
 
     def generate_short_label(self, pdf_content: bytes, filename: str, visa_type: str = 'O-1A') -> str:
         """Generate a concise human-friendly label for a document using AI if available.
 
         Returns a short label (3-10 words). Falls back to heuristics if no AI client available.
         """
-        text = self.extract_text_from_pdf(pdf_content, max_chars=2000)
+        cache_key = self._cache_key('label', pdf_content, visa_type)
+        cached = self._cache_get(cache_key)
+        if cached:
+            return cached
 
-        print(f'generate_short_label called for {filename}')
+        text = self.extract_text_from_pdf(pdf_content, max_chars=4000)
 
         # Try OpenAI if available
         try:
-            import openai
-            openai_api_key = os.getenv('OPENAI_API_KEY')
-            print(f"OpenAI key present in env: {bool(openai_api_key)}")
-            if openai_api_key:
-                openai.api_key = openai_api_key
+            openai = _openai_client(os.getenv('OPENAI_API_KEY'))
+            if openai:
                 prompt = (
                     f"Produce a very short (3-10 words) descriptive label for this immigration document."
-                    f" Return only the label.\nFILENAME: {filename}\nTEXT:\n{text[:2000]}\nLABEL:"
+                    f" Return only the label.\nFILENAME: {filename}\nTEXT:\n{_trim_to_tokens(text, LABEL_TOKEN_BUDGET)}\nLABEL:"
                 )
-                print(f"Calling OpenAI for label: {filename}")
                 resp = openai.ChatCompletion.create(
                     model="gpt-3.5-turbo",
                     messages=[{"role": "user", "content": prompt}],
@@ -270,8 +959,8 @@ IMPORTANT:
                     temperature=0.0
                 )
                 label = resp['choices'][0]['message']['content'].strip().splitlines()[0]
-                print(f"OpenAI label result: {label}")
                 if label:
+                    self._cache_set(cache_key, label[:120])
                     return label[:120]
         except Exception as e:
             print(f"OpenAI label attempt failed: {e}")
@@ -281,9 +970,8 @@ IMPORTANT:
             try:
                 prompt = (
                     f"Produce a very short (3-10 words) descriptive label for this immigration document."
-                    f" Return only the label.\nFILENAME: {filename}\nTEXT:\n{text[:2000]}\nLABEL:"
+                    f" Return only the label.\nFILENAME: {filename}\nTEXT:\n{_trim_to_tokens(text, LABEL_TOKEN_BUDGET)}\nLABEL:"
                 )
-                print(f"Calling Anthropic for label: {filename}")
                 response = self.client.messages.create(
                     model=self.model,
                     max_tokens=60,
@@ -291,29 +979,23 @@ IMPORTANT:
                 )
                 raw = response.content[0].text if hasattr(response, 'content') else str(response)
                 label = raw.strip().splitlines()[0].strip(' "')
-                print(f"Anthropic label result: {label}")
                 if label:
+                    self._cache_set(cache_key, label[:120])
                     return label[:120]
             except Exception:
-                import traceback
                 print(f"Anthropic label attempt failed: {traceback.format_exc()}")
-                pass
 
-        # Heuristic fallback
+        # Heuristic fallback: first matching document type
         lower = (text or "").lower() + " " + filename.lower()
-        for key, kws in DOCUMENT_TYPES.items():
-            if any(kw in lower for kw in kws):
-                stem = os.path.splitext(filename)[0]
-            label = f"{key.replace('_', ' ').title()} — {stem}"[:120]
-            print(f"Heuristic label: {label}")
-            return label
+        doc_type = _detect_document_type(_present_keywords(lower))
+        if doc_type:
+            return f"{doc_type.replace('_', ' ').title()} — {os.path.splitext(filename)[0]}"[:120]
 
         # Use first meaningful line
         for line in (text or "").splitlines():
             s = line.strip()
             if len(s) > 20:
-                print(f'First-line label: {s[:120]}')
-            return s[:120]
+                return s[:120]
 
         return os.path.splitext(filename)[0]
 
@@ -322,6 +1004,11 @@ IMPORTANT:
 
         Uses OpenAI/Anthropic when available; otherwise uses heuristics/regex.
         """
+        cache_key = self._cache_key('analysis', pdf_content, visa_type)
+        cached = self._cache_get(cache_key)
+        if cached:
+            return cached
+
         text = self.extract_text_from_pdf(pdf_content, max_chars=8000)
         analysis: Dict[str, Any] = {
             'summary': None,
@@ -334,26 +1021,28 @@ IMPORTANT:
 
         # Try OpenAI for structured JSON
         try:
-            import openai
-            openai_api_key = os.getenv('OPENAI_API_KEY')
-            if openai_api_key:
-                openai.api_key = openai_api_key
+            openai = _openai_client(os.getenv('OPENAI_API_KEY'))
+            if openai:
                 prompt = (
                     "Extract a short JSON object with keys: summary (1-2 sentences), document_type, dates (array), forms (array), visa_mentions (array), entities (object)."
-                    f"\nFILENAME: {filename}\nTEXT:\n{text[:4000]}\nJSON:"
+                    f"\nFILENAME: {filename}\nTEXT:\n{_trim_to_tokens(text, PROMPT_TOKEN_BUDGET)}\nJSON:"
                 )
                 resp = openai.ChatCompletion.create(
                     model="gpt-3.5-turbo",
                     messages=[{"role": "user", "content": prompt}],
                     max_tokens=400,
-                    temperature=0.0
+                    temperature=0.0,
+                    stream=True
+                )
+                result_text = _read_until_json_closes(
+                    chunk['choices'][0]['delta'].get('content') or '' for chunk in resp
                 )
-                result_text = resp['choices'][0]['message']['content']
                 parsed = self._parse_json_response(result_text)
                 if parsed:
                     for k in analysis.keys():
                         if k in parsed:
                             analysis[k] = parsed[k]
+                    self._cache_set(cache_key, analysis)
                     return analysis
         except Exception:
             pass
@@ -363,49 +1052,41 @@ IMPORTANT:
             try:
                 prompt = (
                     "Extract a short JSON object with keys: summary (1-2 sentences), document_type, dates (array), forms (array), visa_mentions (array), entities (object)."
-                    f"\nFILENAME: {filename}\nTEXT:\n{text[:4000]}\nJSON:"
+                    f"\nFILENAME: {filename}\nTEXT:\n{_trim_to_tokens(text, PROMPT_TOKEN_BUDGET)}\nJSON:"
                 )
-                response = self.client.messages.create(
+                with self.client.messages.stream(
                     model=self.model,
                     max_tokens=400,
                     messages=[{"role": "user", "content": prompt}]
-                )
-                result_text = response.content[0].text
+                ) as stream:
+                    result_text = _read_until_json_closes(stream.text_stream)
                 parsed = self._parse_json_response(result_text)
                 if parsed:
                     for k in analysis.keys():
                         if k in parsed:
                             analysis[k] = parsed[k]
+                    self._cache_set(cache_key, analysis)
                     return analysis
             except Exception:
                 pass
 
-        # Heuristic extraction
-        import re
-
-        # dates
-        months = r"(?:January|February|March|April|May|June|July|August|September|October|November|December)"
-        date_patterns = [r"\b\d{4}\b", r"\b\d{1,2}[/-]\d{1,2}[/-]\d{2,4}\b", months + r" \d{1,2},? \d{4}"]
-        found_dates = set()
-        for p in date_patterns:
-            for m in re.findall(p, text, flags=re.IGNORECASE):
-                found_dates.add(m)
+        # Heuristic extraction: dates, forms and visa mentions in one pass
+        found_dates, forms, visas = set(), set(), set()
+        for m in _ANALYZE_RE.finditer(text):
+            kind = m.lastgroup
+            if kind == 'form':
+                forms.add(m.group(kind).upper())
+            elif kind == 'visa':
+                visas.add(m.group(kind).upper())
+            else:
+                found_dates.add(m.group(kind))
         analysis['dates'] = list(found_dates)
-
-        # forms
-        forms = set(m[1].upper() for m in re.findall(r"\b(Form\s+)?(I-129|I-907|G-1450|I-485|DS-160)\b", text, flags=re.IGNORECASE))
         analysis['forms'] = list(forms)
-
-        # visa mentions
-        visas = set(m.upper() for m in re.findall(r"\b(O-1A|O-1B|P-1A|P-1B|F-1|H-1B|EB-1A|EB-1B|EB-2)\b", text, flags=re.IGNORECASE))
         analysis['visa_mentions'] = list(visas)
 
         # document_type via keywords
         lower = (text or "").lower() + " " + filename.lower()
-        for dtype, kws in DOCUMENT_TYPES.items():
-            if any(kw in lower for kw in kws):
-                analysis['document_type'] = dtype
-                break
+        analysis['document_type'] = _detect_document_type(_present_keywords(lower))
 
         # summary: first two meaningful lines
         summary_lines = []
@@ -428,6 +1109,118 @@ IMPORTANT:
 
         return analysis
 
+    async def classify_batch(self, items: List[Tuple[bytes, str, str]]) -> List[Dict[str, Any]]:
+        """Generate short labels and content analyses for many PDFs concurrently.
+
+        Args:
+            items: List of (pdf_content, filename, visa_type) tuples
+
+        Returns:
+            List of dicts with 'short_label' and 'analysis' keys, in input order.
+            Uses one combined Claude request per document over a shared async
+            client; falls back to generate_short_label/analyze_pdf otherwise.
+        """
+        if not items:
+            return []
+
+        async_client = self._make_async_client()
+        if async_client is None:
+            return list(await asyncio.gather(*(
+                asyncio.to_thread(self._label_and_analyze, *item) for item in items
+            )))
+
+        semaphore = asyncio.Semaphore(BATCH_MAX_CONNECTIONS)
+
+        async def run_one(item: Tuple[bytes, str, str]) -> Dict[str, Any]:
+            async with semaphore:
+                return await self._label_and_analyze_async(async_client, *item)
+
+        try:
+            return list(await asyncio.gather(*(run_one(item) for item in items)))
+        finally:
+            await async_client.close()
+
+    def _make_async_client(self) -> Any:
+        """AsyncAnthropic client over a pooled HTTP connection (None if unavailable)"""
+        if not self.api_key:
+            return None
+        try:
+            import anthropic
+            import httpx
+        except ImportError:
+            return None
+        return anthropic.AsyncAnthropic(
+            api_key=self.api_key,
+            max_retries=CLASSIFY_MAX_RETRIES,
+            http_client=httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=BATCH_MAX_CONNECTIONS)
+            )
+        )
+
+    def _label_and_analyze(self, pdf_content: bytes, filename: str, visa_type: str) -> Dict[str, Any]:
+        """Label and analyze a single document with the per-call methods"""
+        return {
+            'short_label': self.generate_short_label(pdf_content, filename, visa_type),
+            'analysis': self.analyze_pdf(pdf_content, filename, visa_type),
+        }
+
+    async def _label_and_analyze_async(
+        self,
+        async_client: Any,
+        pdf_content: bytes,
+        filename: str,
+        visa_type: str
+    ) -> Dict[str, Any]:
+        """Label and analyze a single document with one combined Claude request"""
+        label_key = self._cache_key('label', pdf_content, visa_type)
+        analysis_key = self._cache_key('analysis', pdf_content, visa_type)
+        cached_label = self._cache_get(label_key)
+        cached_analysis = self._cache_get(analysis_key)
+        if cached_label and cached_analysis:
+            return {'short_label': cached_label, 'analysis': cached_analysis}
+
+        text = await asyncio.to_thread(self.extract_text_from_pdf, pdf_content, 8000)
+
+        prompt = (
+            "Return a JSON object with two keys for this immigration document:\n"
+            "short_label: a very short (3-10 words) descriptive label\n"
+            "analysis: an object with keys summary (1-2 sentences), document_type, dates (array), "
+            "forms (array), visa_mentions (array), entities (object)."
+            f"\nVISA TYPE: {visa_type}\nFILENAME: {filename}\nTEXT:\n{_trim_to_tokens(text, PROMPT_TOKEN_BUDGET)}\nJSON:"
+        )
+
+        try:
+            response = await async_client.messages.create(
+                model=self.model,
+                max_tokens=500,
+                messages=[{"role": "user", "content": prompt}]
+            )
+            parsed = self._parse_json_response(response.content[0].text)
+        except Exception as e:
+            print(f"Batched AI analysis failed for {filename}: {e}")
+            parsed = {}
+
+        short_label = str(parsed.get('short_label') or '').strip().strip('"')
+        parsed_analysis = parsed.get('analysis')
+        if not short_label or not isinstance(parsed_analysis, dict):
+            return await asyncio.to_thread(self._label_and_analyze, pdf_content, filename, visa_type)
+
+        analysis: Dict[str, Any] = {
+            'summary': None,
+            'document_type': None,
+            'dates': [],
+            'forms': [],
+            'visa_mentions': [],
+            'entities': {},
+        }
+        for k in analysis.keys():
+            if k in parsed_analysis:
+                analysis[k] = parsed_analysis[k]
+
+        self._cache_set(label_key, short_label[:120])
+        self._cache_set(analysis_key, analysis)
+        return {'short_label': short_label[:120], 'analysis': analysis}
+
     def _classify_with_rules(
         self,
         text: str,
@@ -437,31 +1230,80 @@ IMPORTANT:
     ) -> ClassificationResult:
         """Classify using keyword rules (fallback)"""
         text_lower = text.lower() + " " + filename.lower()
-        criteria = VISA_CRITERIA.get(visa_type, VISA_CRITERIA['O-1A'])
+        criteria_key = visa_type if visa_type in VISA_CRITERIA else 'O-1A'
+        present = _present_keywords(text_lower)
 
         # Score each criterion
-        scores = {}
-        for code, info in criteria.items():
-            score = sum(1 for kw in info['keywords'] if kw in text_lower)
-            scores[code] = score
+        scores = _score_criteria(criteria_key, present)
 
         # Get best match
-        best_code = max(scores, key=scores.get) if scores else list(criteria.keys())[0]
+        best_code = max(scores, key=scores.get) if scores else _CRIT_KEYS[criteria_key][0]
         best_score = scores.get(best_code, 0)
+
+        return self._rules_result(
+            filename, visa_type, document_id, criteria_key, best_code, best_score, present
+        )
+
+    def _classify_with_rules_batch(
+        self,
+        texts: List[str],
+        filenames: List[str],
+        visa_type: str,
+        document_ids: List[str]
+    ) -> List[ClassificationResult]:
+        """Rule-based classification of many documents with one hits @ indicator product"""
+        criteria_key = visa_type if visa_type in VISA_CRITERIA else 'O-1A'
+        if not NUMPY_AVAILABLE:
+            return [
+                self._classify_with_rules(text, filename, visa_type, document_id)
+                for text, filename, document_id in zip(texts, filenames, document_ids)
+            ]
+
+        kw_index, indicator = _RULE_MATRICES[criteria_key]
+        presents = [
+            _present_keywords(text.lower() + " " + filename.lower())
+            for text, filename in zip(texts, filenames)
+        ]
+
+        hits = np.zeros((len(presents), len(kw_index)), dtype=np.float32)
+        for row, present in enumerate(presents):
+            cols = [kw_index[kw] for kw in present if kw in kw_index]
+            hits[row, cols] = 1
+
+        scores = hits @ indicator
+        best = scores.argmax(axis=1)
+        best_scores = scores[np.arange(len(presents)), best]
+        codes = _CRIT_KEYS[criteria_key]
+
+        return [
+            self._rules_result(
+                filename, visa_type, document_id, criteria_key,
+                codes[int(best[row])], int(best_scores[row]), present
+            )
+            for row, (filename, document_id, present) in enumerate(zip(filenames, document_ids, presents))
+        ]
+
+    def _rules_result(
+        self,
+        filename: str,
+        visa_type: str,
+        document_id: str,
+        criteria_key: str,
+        best_code: str,
+        best_score: int,
+        present: Set[str]
+    ) -> ClassificationResult:
+        """Build the rule-based ClassificationResult for a scored document"""
+        criteria = VISA_CRITERIA[criteria_key]
         max_possible = len(criteria[best_code]['keywords'])
         confidence = min(best_score / max(max_possible, 1), 1.0) * 0.8  # Cap at 80% for rule-based
 
         # Detect document type
-        doc_type = 'other'
-        for dtype, keywords in DOCUMENT_TYPES.items():
-            if any(kw in text_lower for kw in keywords):
-                doc_type = dtype
-                break
+        doc_type = _detect_document_type(present) or 'other'
 
         # Suggest exhibit letter based on position
-        letter_map = {i: chr(65 + i) for i in range(26)}
-        criterion_index = list(criteria.keys()).index(best_code)
-        suggested_letter = letter_map.get(criterion_index, 'Z')
+        criterion_index = _CRIT_INDEX[criteria_key][best_code]
+        suggested_letter = _LETTER[criterion_index] if criterion_index < len(_LETTER) else 'Z'
 
         return ClassificationResult(
             document_id=document_id,
@@ -487,24 +1329,24 @@ IMPORTANT:
             pass
         return {}
 
+    @staticmethod
     def detect_missing_criteria(
-        self,
         classifications: List[ClassificationResult],
-        visa_type: str
+        visa_type: str,
+        present_codes: Optional[Set[str]] = None
     ) -> List[Dict[str, str]]:
-        """Identify missing criteria for the visa type"""
-        criteria = VISA_CRITERIA.get(visa_type, {})
-        present_codes = {c.criterion_code for c in classifications}
-
-        missing = []
-        for code, info in criteria.items():
-            if code not in present_codes:
-                missing.append({
-                    'criterion_code': code,
-                    'criterion_name': info['name'],
-                    'importance': 'recommended'
-                })
-        return missing
+        """Identify missing criteria for the visa type (pass present_codes if already collected)"""
+        if present_codes is None:
+            present_codes = {c.criterion_code for c in classifications}
+        return [
+            {
+                'criterion_code': code,
+                'criterion_name': info['name'],
+                'importance': 'recommended'
+            }
+            for code, info in VISA_CRITERIA.get(visa_type, {}).items()
+            if code not in present_codes
+        ]
 
     def suggest_exhibit_order(
         self,
@@ -512,17 +1354,11 @@ IMPORTANT:
         visa_type: str
     ) -> List[ClassificationResult]:
         """Suggest optimal exhibit ordering"""
-        criteria = VISA_CRITERIA.get(visa_type, {})
-        criteria_order = list(criteria.keys())
-
-        def sort_key(c: ClassificationResult) -> Tuple[int, float]:
-            try:
-                idx = criteria_order.index(c.criterion_code)
-            except ValueError:
-                idx = 999
-            return (idx, -c.confidence_score)
-
-        return sorted(classifications, key=sort_key)
+        rank = _CRIT_INDEX.get(visa_type, {})
+        return sorted(
+            classifications,
+            key=lambda c: (rank.get(c.criterion_code, 999), -c.confidence_score)
+        )
 
 
 def render_classification_ui(
@@ -536,20 +1372,23 @@ def render_classification_ui(
         st.info("No documents classified yet. Upload files to begin.")
         return classifications
 
-    # Summary metrics
+    # Summary metrics, aggregated in one pass
+    total_confidence = 0.0
+    present_codes = set()
+    for c in classifications:
+        total_confidence += c.confidence_score
+        present_codes.add(c.criterion_code)
+
     col1, col2, col3 = st.columns(3)
     with col1:
-        avg_confidence = sum(c.confidence_score for c in classifications) / len(classifications)
-        st.metric("Average Confidence", f"{avg_confidence:.0%}")
+        st.metric("Average Confidence", f"{total_confidence / len(classifications):.0%}")
     with col2:
-        unique_criteria = len(set(c.criterion_code for c in classifications))
-        st.metric("Criteria Covered", unique_criteria)
+        st.metric("Criteria Covered", len(present_codes))
     with col3:
         st.metric("Documents", len(classifications))
 
-    # Missing criteria warning
-    classifier = AIClassifier()
-    missing = classifier.detect_missing_criteria(classifications, visa_type)
+    # Missing criteria warning (static: no classifier or API client needed)
+    missing = AIClassifier.detect_missing_criteria(classifications, visa_type, present_codes)
     if missing:
         with st.expander(f"⚠️ Missing Criteria ({len(missing)})", expanded=True):
             for m in missing:
@@ -557,6 +1396,11 @@ def render_classification_ui(
 
     st.markdown("---")
 
+    # Override options are the same for every document
+    criteria = VISA_CRITERIA.get(visa_type, {})
+    criterion_options = [f"{code}: {info['name']}" for code, info in criteria.items()]
+    option_index = _CRIT_INDEX.get(visa_type, {})
+
     # Classification list
     updated_classifications = []
     for i, c in enumerate(classifications):
@@ -575,12 +1419,7 @@ def render_classification_ui(
 
             with col2:
                 # Allow override
-                criteria = VISA_CRITERIA.get(visa_type, {})
-                criterion_options = [f"{code}: {info['name']}" for code, info in criteria.items()]
-                current_idx = next(
-                    (i for i, opt in enumerate(criterion_options) if opt.startswith(c.criterion_code)),
-                    0
-                )
+                current_idx = option_index.get(c.criterion_code, 0)
 
                 new_criterion = st.selectbox(
                     "Override Classification",
@@ -605,12 +1444,18 @@ def get_classifications() -> List[ClassificationResult]:
     """Get classifications from session state"""
     if 'classifications' not in st.session_state:
         st.session_state.classifications = []
-    return [
+    classifications = st.session_state.classifications
+    if all(isinstance(c, ClassificationResult) for c in classifications):
+        return classifications
+    # Older sessions stored plain dicts; convert once and keep the objects
+    classifications = [
         ClassificationResult(**c) if isinstance(c, dict) else c
-        for c in st.session_state.classifications
+        for c in classifications
     ]
+    st.session_state.classifications = classifications
+    return classifications
 
 
 def save_classifications(classifications: List[ClassificationResult]):
-    """Save classifications to session state"""
-    st.session_state.classifications = [c.to_dict() for c in classifications]
+    """Save classifications to session state (use to_dict() when persisting elsewhere)"""
+    st.session_state.classifications = list(classifications)
@@ -19,12 +19,14 @@ Example commands:
 """
 
 import streamlit as st
-from typing import List, Dict, Any, Optional
-import json
+from typing import List, Dict, Any, Optional, Tuple
+from collections import OrderedDict
+import functools
+import importlib.util
 import re
 import logging
+import threading
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Check for Claude API
@@ -34,6 +36,177 @@ try:
 except ImportError:
     CLAUDE_AVAILABLE = False
 
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+# Checked without importing: sentence-transformers pulls in torch, so it is
+# only loaded by _command_index on first use
+EMBEDDINGS_AVAILABLE = NUMPY_AVAILABLE and importlib.util.find_spec("sentence_transformers") is not None
+
+# Instruction and response patterns, compiled once. Captures are limited to
+# one line and only run when the instruction contains their keywords
+_PUT_FIRST_RE = re.compile(r"put\s+([^\n]+?)\s+first\b")
+_MOVE_BEFORE_RE = re.compile(r"move\s+([^\n]+?)\s+before\s+(\S[^\n]*)")
+_WORD_RE = re.compile(r"[a-z0-9-]+")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+# Claude returns the new order through this tool instead of free-form JSON
+REORDER_TOOL = {
+    "name": "reorder_exhibits",
+    "description": "Apply a new exhibit order",
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            "action": {"type": "string", "enum": ["reorder", "unknown"]},
+            "new_order": {"type": "array", "items": {"type": "integer"}},
+            "explanation": {"type": "string"}
+        },
+        "required": ["action", "new_order"]
+    }
+}
+
+# Parsed instructions remembered per (instruction, exhibit list)
+INSTRUCTION_CACHE_SIZE = 128
+
+# A known command whose embedding similarity reaches this threshold is passed
+# to Claude as a hint (needs sentence-transformers). Its parsed order is never
+# reused: paraphrases can name the same items in a different order
+COMMAND_MATCH_MODEL = 'sentence-transformers/all-MiniLM-L6-v2'
+COMMAND_MATCH_THRESHOLD = 0.9
+
+# Embeddings barely separate "first" from "last"; a hint must use the same
+# direction words as the instruction
+_DIRECTION_WORDS = frozenset({
+    "first", "last", "start", "end", "beginning", "before", "after", "top", "bottom",
+    "largest", "smallest", "highest", "lowest", "most", "fewest", "ascending", "descending",
+    "reverse", "reversed", "a-z", "z-a"
+})
+
+QUICK_COMMANDS = [
+    ("📝 A-Z", "Sort alphabetically by name"),
+    ("📊 By Criterion", "Group exhibits by criterion letter"),
+    ("📄 By Pages", "Sort by page count (largest first)"),
+    ("↩️ Reverse", "Reverse the current order")
+]
+
+BASE_SUGGESTIONS = [
+    "Put passport first, then CV, then forms",
+    "Group all award documents together",
+    "Sort by criterion letter",
+    "Put expert letters at the end"
+]
+
+VISA_SUGGESTIONS = {
+    "O-1A": [
+        "Put administrative docs first, then criterion evidence by letter A-H",
+        "Group all media articles together after awards"
+    ],
+    "P-1A": [
+        "Put contract and itinerary first after forms",
+        "Group all athletic achievements together"
+    ],
+    "EB-1A": [
+        "Order exhibits to match petition letter criteria order",
+        "Put original contributions evidence prominently"
+    ]
+}
+
+# Rule-parser vocabulary, matched against the instruction's word set
+_NAME_SORT_WORDS = frozenset({"a-z", "alphabetic", "alphabetical", "alphabetically"})
+_PAGE_WORDS = frozenset({"page", "pages"})
+_SORT_WORDS = frozenset({"sort", "sorted", "sorting"})
+_CRITERION_WORDS = frozenset({"criterion", "criteria"})
+_REVERSE_WORDS = frozenset({"reverse", "reversed"})
+
+# Sort rules: key, descending, explanation
+_SORT_RULES = {
+    "name": (lambda ex: ex.get("name", "").lower(), False, "Sorted alphabetically by name"),
+    "pages": (lambda ex: ex.get("page_count", 0), True, "Sorted by page count (highest first)"),
+    "criterion": (lambda ex: ex.get("criterion_letter", "ZZZ"), False, "Sorted by criterion letter"),
+}
+
+# Exhibit letters by position: A-Z, then AA-AZ, BA-BZ, ... ZZ (702 labels)
+_EXHIBIT_LABELS = tuple(
+    [chr(65 + i) for i in range(26)]
+    + [chr(65 + i) + chr(65 + j) for i in range(26) for j in range(26)]
+)
+
+# Exhibit count from which sort rules use numpy's argsort
+VECTORIZED_SORT_MIN = 64
+
+
+def _sort_order(values: List[Any], descending: bool) -> List[int]:
+    """
+    Stable argsort of values; ties keep their current relative order.
+
+    Long lists are sorted by numpy when available.
+    """
+    if NUMPY_AVAILABLE and len(values) >= VECTORIZED_SORT_MIN:
+        if not descending:
+            return np.argsort(np.array(values), kind="stable").tolist()
+        # Stable descending: sort the reversed array and map back
+        last = len(values) - 1
+        return (last - np.argsort(np.array(values[::-1]), kind="stable")[::-1]).tolist()
+    return sorted(range(len(values)), key=values.__getitem__, reverse=descending)
+
+
+@functools.lru_cache(maxsize=1)
+def _command_index() -> Optional[Tuple[Any, List[str], Any]]:
+    """
+    Embedding model, known commands and their embedding matrix.
+
+    Every quick command and suggestion is embedded in a single batched
+    encode call on first use. Returns None if embeddings are unavailable.
+    """
+    if not EMBEDDINGS_AVAILABLE:
+        return None
+    try:
+        from sentence_transformers import SentenceTransformer
+        model = SentenceTransformer(COMMAND_MATCH_MODEL)
+    except Exception as e:
+        logger.warning("Command embedding model unavailable: %s", e)
+        return None
+    commands = list(dict.fromkeys(
+        [command for _, command in QUICK_COMMANDS]
+        + BASE_SUGGESTIONS
+        + [s for suggestions in VISA_SUGGESTIONS.values() for s in suggestions]
+    ))
+    matrix = model.encode(commands, batch_size=len(commands), normalize_embeddings=True)
+    return model, commands, matrix
+
+
+def _closest_command(instruction: str) -> Optional[str]:
+    """Known command most similar to instruction, if above COMMAND_MATCH_THRESHOLD."""
+    index = _command_index()
+    if index is None:
+        return None
+    model, commands, matrix = index
+    sims = matrix @ model.encode(instruction, normalize_embeddings=True)
+    best = int(sims.argmax())
+    if sims[best] < COMMAND_MATCH_THRESHOLD:
+        return None
+    directions = _DIRECTION_WORDS.intersection(_WORD_RE.findall(instruction.lower()))
+    if directions != _DIRECTION_WORDS.intersection(_WORD_RE.findall(commands[best].lower())):
+        return None
+    return commands[best]
+
+
+def _move_before(count: int, move_idx: int, target_idx: int) -> List[int]:
+    """
+    Order of range(count) with move_idx placed just before target_idx.
+
+    Built from slices of the identity order, so no list searches are needed.
+    Moving an item before itself puts it first.
+    """
+    if move_idx == target_idx:
+        target_idx = 0
+    if target_idx <= move_idx:
+        return [*range(target_idx), move_idx, *range(target_idx, move_idx), *range(move_idx + 1, count)]
+    return [*range(move_idx), *range(move_idx + 1, target_idx), move_idx, *range(target_idx, count)]
+
 
 class ArrangementChat:
     """
@@ -54,6 +227,9 @@ class ArrangementChat:
         if self.api_key and CLAUDE_AVAILABLE:
             self.client = Anthropic(api_key=self.api_key)
 
+        self._cache: "OrderedDict[Tuple, Dict[str, Any]]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+
     def parse_instruction(
         self,
         instruction: str,
@@ -69,22 +245,61 @@ class ArrangementChat:
         Returns:
             Dict with action and new_order
         """
+        # Only the exact (normalized) instruction may reuse a cached order
+        cache_key = self._cache_key(instruction, exhibits)
+        cached = self._cache_get(cache_key)
+        if cached is not None:
+            return cached
+
+        result = None
+
         # Try AI parsing first
         if self.client:
             try:
-                return self._parse_with_claude(instruction, exhibits)
+                result = self._parse_with_claude(instruction, exhibits, _closest_command(instruction))
             except Exception as e:
-                logger.warning(f"Claude parsing failed: {e}")
-
-        # Fall back to rule-based parsing
-        return self._parse_with_rules(instruction, exhibits)
+                logger.warning("Claude parsing failed: %s", e)
+
+        if result is None:
+            # Fall back to rule-based parsing
+            result = self._parse_with_rules(instruction, exhibits)
+            if self.client:
+                # Don't pin a fallback caused by a transient API error
+                return result
+
+        with self._cache_lock:
+            self._cache[cache_key] = {**result, "new_order": list(result["new_order"])}
+            while len(self._cache) > INSTRUCTION_CACHE_SIZE:
+                self._cache.popitem(last=False)
+        return result
+
+    def _cache_get(self, cache_key: Tuple) -> Optional[Dict[str, Any]]:
+        """Copy of the cached result for cache_key, or None"""
+        with self._cache_lock:
+            cached = self._cache.get(cache_key)
+            if cached is None:
+                return None
+            self._cache.move_to_end(cache_key)
+            return {**cached, "new_order": list(cached["new_order"])}
+
+    @staticmethod
+    def _cache_key(instruction: str, exhibits: List[Dict[str, Any]]) -> Tuple:
+        """Normalized instruction plus the fields the parsers look at"""
+        return (
+            _WHITESPACE_RE.sub(" ", instruction.strip().lower()),
+            tuple(
+                (ex.get("name"), ex.get("filename"), ex.get("criterion_letter"), ex.get("page_count"))
+                for ex in exhibits
+            )
+        )
 
     def _parse_with_claude(
         self,
         instruction: str,
-        exhibits: List[Dict[str, Any]]
+        exhibits: List[Dict[str, Any]],
+        similar_command: Optional[str] = None
     ) -> Dict[str, Any]:
-        """Use Claude to parse arrangement instruction."""
+        """Use Claude to parse arrangement instruction (similar_command is a phrasing hint only)."""
         # Build exhibit list for context
         exhibit_list = "\n".join([
             f"{i}. {ex.get('name', ex.get('filename', 'Unknown'))} "
@@ -93,17 +308,15 @@ class ArrangementChat:
             for i, ex in enumerate(exhibits)
         ])
 
-        prompt = f"""You are an exhibit arrangement assistant for visa petitions.
+        # Everything except the instruction is identical for repeat commands
+        # against the same exhibits, so it goes first as a cacheable block
+        context = f"""You are an exhibit arrangement assistant for visa petitions.
 
 CURRENT EXHIBIT ORDER (0-indexed):
 {exhibit_list}
 
-USER INSTRUCTION: "{instruction}"
-
-Analyze this instruction and determine how to reorder the exhibits.
-Return ONLY a valid JSON object (no markdown, no explanation) in this exact format:
-
-{{"action": "reorder", "new_order": [list of indices], "explanation": "brief explanation"}}
+Analyze the user instruction that follows and determine how to reorder the exhibits.
+Call the reorder_exhibits tool with the new order and a brief explanation.
 
 Rules:
 - "new_order" must contain ALL indices from 0 to {len(exhibits) - 1}
@@ -116,28 +329,37 @@ Examples:
 - "Group awards together" → keep award items adjacent
 - "Move item 3 to position 1" → reorder so index 3 becomes position 1
 
-If you cannot understand the instruction, return:
-{{"action": "unknown", "new_order": {list(range(len(exhibits)))}, "explanation": "Could not understand instruction"}}
+If you cannot understand the instruction, call it with action "unknown" and the current order.
 """
+        content = [
+            {"type": "text", "text": context, "cache_control": {"type": "ephemeral"}},
+            {"type": "text", "text": f'USER INSTRUCTION: "{instruction}"'}
+        ]
+        if similar_command and similar_command.strip().lower() != instruction.strip().lower():
+            content.append({
+                "type": "text",
+                "text": f'(It reads like the known command "{similar_command}", '
+                        f'but follow the user instruction exactly.)'
+            })
 
+        # The forced tool call is the whole reply, so output stays a few
+        # tokens per exhibit and needs no parsing
         response = self.client.messages.create(
             model="claude-sonnet-4-20250514",
-            max_tokens=500,
-            messages=[{"role": "user", "content": prompt}]
+            max_tokens=100 + 4 * len(exhibits),
+            tools=[REORDER_TOOL],
+            tool_choice={"type": "tool", "name": REORDER_TOOL["name"]},
+            messages=[{"role": "user", "content": content}]
         )
-
-        # Parse JSON response
-        text = response.content[0].text.strip()
-
-        # Clean up response (remove markdown if present)
-        if text.startswith("```"):
-            text = re.sub(r'^```json?\s*', '', text)
-            text = re.sub(r'\s*```$', '', text)
-
-        result = json.loads(text)
+        if response.stop_reason == "max_tokens":
+            # A truncated tool call has an incomplete order; let the rules handle it
+            raise ValueError("reorder_exhibits call truncated at max_tokens")
+        result = next(block.input for block in response.content if block.type == "tool_use")
 
         # Validate new_order
-        new_order = result.get("new_order", list(range(len(exhibits))))
+        new_order = result.get("new_order")
+        if not isinstance(new_order, list):
+            raise ValueError("new_order missing from tool call")
         if len(new_order) != len(exhibits):
             raise ValueError("new_order length mismatch")
         if set(new_order) != set(range(len(exhibits))):
@@ -157,56 +379,50 @@ If you cannot understand the instruction, return:
     ) -> Dict[str, Any]:
         """Rule-based parsing fallback."""
         instruction_lower = instruction.lower()
+        words = set(_WORD_RE.findall(instruction_lower))
         indices = list(range(len(exhibits)))
 
-        # Sort by name (A-Z)
-        if "a-z" in instruction_lower or "alphabetic" in instruction_lower or "by name" in instruction_lower:
-            sorted_pairs = sorted(enumerate(exhibits), key=lambda x: x[1].get("name", "").lower())
-            return {
-                "action": "sort",
-                "new_order": [p[0] for p in sorted_pairs],
-                "explanation": "Sorted alphabetically by name",
-                "method": "rules"
-            }
-
-        # Sort by page count
-        if "page" in instruction_lower and "sort" in instruction_lower:
-            sorted_pairs = sorted(enumerate(exhibits), key=lambda x: x[1].get("page_count", 0), reverse=True)
-            return {
-                "action": "sort",
-                "new_order": [p[0] for p in sorted_pairs],
-                "explanation": "Sorted by page count (highest first)",
-                "method": "rules"
-            }
+        # Sort by name (A-Z), page count or criterion
+        if "by name" in instruction_lower or not words.isdisjoint(_NAME_SORT_WORDS):
+            sort_rule = "name"
+        elif not words.isdisjoint(_PAGE_WORDS) and not words.isdisjoint(_SORT_WORDS):
+            sort_rule = "pages"
+        elif not words.isdisjoint(_CRITERION_WORDS):
+            sort_rule = "criterion"
+        else:
+            sort_rule = None
 
-        # Sort by criterion
-        if "criterion" in instruction_lower or "criteria" in instruction_lower:
-            sorted_pairs = sorted(enumerate(exhibits), key=lambda x: x[1].get("criterion_letter", "ZZZ"))
+        if sort_rule:
+            key, descending, explanation = _SORT_RULES[sort_rule]
             return {
                 "action": "sort",
-                "new_order": [p[0] for p in sorted_pairs],
-                "explanation": "Sorted by criterion letter",
+                "new_order": _sort_order([key(ex) for ex in exhibits], descending),
+                "explanation": explanation,
                 "method": "rules"
             }
 
         # Put X first
-        first_match = re.search(r"put\s+(.+?)\s+first", instruction_lower)
+        first_match = (
+            _PUT_FIRST_RE.search(instruction_lower)
+            if "put" in words and "first" in words else None
+        )
         if first_match:
             search_term = first_match.group(1)
             for i, ex in enumerate(exhibits):
                 name = ex.get("name", "").lower()
                 if search_term in name:
-                    indices.remove(i)
-                    indices.insert(0, i)
                     return {
                         "action": "move",
-                        "new_order": indices,
+                        "new_order": _move_before(len(exhibits), i, 0),
                         "explanation": f"Moved '{ex.get('name', '')}' to first position",
                         "method": "rules"
                     }
 
         # Move X before Y
-        before_match = re.search(r"move\s+(.+?)\s+before\s+(.+)", instruction_lower)
+        before_match = (
+            _MOVE_BEFORE_RE.search(instruction_lower)
+            if "move" in words and "before" in words else None
+        )
         if before_match:
             item_to_move = before_match.group(1)
             target_item = before_match.group(2)
@@ -222,18 +438,15 @@ If you cannot understand the instruction, return:
                     target_idx = i
 
             if move_idx is not None and target_idx is not None:
-                indices.remove(move_idx)
-                insert_pos = indices.index(target_idx) if target_idx in indices else 0
-                indices.insert(insert_pos, move_idx)
                 return {
                     "action": "move",
-                    "new_order": indices,
+                    "new_order": _move_before(len(exhibits), move_idx, target_idx),
                     "explanation": f"Moved item before target",
                     "method": "rules"
                 }
 
         # Reverse order
-        if "reverse" in instruction_lower:
+        if not words.isdisjoint(_REVERSE_WORDS):
             return {
                 "action": "reverse",
                 "new_order": list(reversed(indices)),
@@ -250,6 +463,12 @@ If you cannot understand the instruction, return:
         }
 
 
+@st.cache_resource
+def _get_chat(api_key: Optional[str]) -> ArrangementChat:
+    """ArrangementChat per API key, shared across reruns so its HTTP client is reused."""
+    return ArrangementChat(api_key)
+
+
 def render_arrangement_chat(
     exhibits: List[Dict[str, Any]],
     api_key: Optional[str] = None
@@ -293,7 +512,7 @@ def render_arrangement_chat(
 
         # Process instruction
         with st.spinner("Rearranging exhibits..."):
-            chat = ArrangementChat(api_key)
+            chat = _get_chat(api_key)
             result = chat.parse_instruction(instruction, exhibits)
 
         # Apply new order if successful
@@ -301,8 +520,8 @@ def render_arrangement_chat(
             new_exhibits = [exhibits[i] for i in result["new_order"]]
 
             # Update exhibit numbers
-            for i, ex in enumerate(new_exhibits):
-                ex["exhibit_number"] = chr(65 + i) if i < 26 else f"A{chr(65 + i - 26)}"
+            for ex, label in zip(new_exhibits, _EXHIBIT_LABELS):
+                ex["exhibit_number"] = label
 
             response = f"✅ {result['explanation']}"
             st.session_state.arrangement_chat_history.append({
@@ -337,14 +556,7 @@ def render_quick_commands() -> Optional[str]:
 
     cols = st.columns(4)
 
-    commands = [
-        ("📝 A-Z", "Sort alphabetically by name"),
-        ("📊 By Criterion", "Group exhibits by criterion letter"),
-        ("📄 By Pages", "Sort by page count (largest first)"),
-        ("↩️ Reverse", "Reverse the current order")
-    ]
-
-    for i, (label, command) in enumerate(commands):
+    for i, (label, command) in enumerate(QUICK_COMMANDS):
         with cols[i]:
             if st.button(label, key=f"quick_cmd_{i}"):
                 return command
@@ -362,26 +574,4 @@ def get_suggested_instructions(visa_type: str) -> List[str]:
     Returns:
         List of suggested instruction strings
     """
-    base_suggestions = [
-        "Put passport first, then CV, then forms",
-        "Group all award documents together",
-        "Sort by criterion letter",
-        "Put expert letters at the end"
-    ]
-
-    visa_specific = {
-        "O-1A": [
-            "Put administrative docs first, then criterion evidence by letter A-H",
-            "Group all media articles together after awards"
-        ],
-        "P-1A": [
-            "Put contract and itinerary first after forms",
-            "Group all athletic achievements together"
-        ],
-        "EB-1A": [
-            "Order exhibits to match petition letter criteria order",
-            "Put original contributions evidence prominently"
-        ]
-    }
-
-    return base_suggestions + visa_specific.get(visa_type, [])
+    return BASE_SUGGESTIONS + VISA_SUGGESTIONS.get(visa_type, [])
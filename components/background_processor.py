@@ -10,14 +10,18 @@ Async processing with progress tracking.
 """
 
 import streamlit as st
+import logging
 from dataclasses import dataclass, field
-from typing import List, Optional, Dict, Any, Callable
-from enum import Enum
+from typing import List, Optional, Dict, Any, Callable, Tuple, NamedTuple, Union
+from enum import Enum, IntEnum
+import os
 import threading
 import time
-import traceback
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 
+logger = logging.getLogger(__name__)
+
 
 class ProcessingStatus(Enum):
     """Processing status enum"""
@@ -28,16 +32,79 @@ class ProcessingStatus(Enum):
     CANCELLED = "cancelled"
 
 
+class StepStatus(IntEnum):
+    """Processing step status (values index _STATUS_ICONS)"""
+    PENDING = 0
+    RUNNING = 1
+    COMPLETED = 2
+    ERROR = 3
+
+    @classmethod
+    def coerce(cls, status: Union[str, int]) -> 'StepStatus':
+        """Accept a StepStatus or its lowercase name ("running", ...)"""
+        return _STEP_STATUS_BY_NAME[status] if isinstance(status, str) else cls(status)
+
+
+_STEP_STATUS_BY_NAME = {status.name.lower(): status for status in StepStatus}
+_STATUS_ICONS = ("⬜", "⏳", "✅", "❌")
+
+
+# Wall-clock reading paired with a monotonic one, to render monotonic
+# timestamps as ISO strings only when they are serialized
+_WALL_ANCHOR_NS = time.time_ns()
+_MONOTONIC_ANCHOR_NS = time.monotonic_ns()
+
+
+def _monotonic_to_iso(timestamp_ns: int) -> Optional[str]:
+    """ISO wall-clock time for a time.monotonic_ns() reading (None if unset)"""
+    if not timestamp_ns:
+        return None
+    return datetime.fromtimestamp(
+        (_WALL_ANCHOR_NS + timestamp_ns - _MONOTONIC_ANCHOR_NS) / 1e9
+    ).isoformat()
+
+
+class ProcessingCancelled(Exception):
+    """Raised inside the processing thread once cancel() has been called"""
+
+
 @dataclass
 class ProcessingStep:
     """Represents a processing step"""
     name: str
     description: str
-    status: str = "pending"  # pending, running, completed, error
+    status: StepStatus = StepStatus.PENDING
     progress: float = 0.0
     error_message: Optional[str] = None
-    started_at: Optional[str] = None
-    completed_at: Optional[str] = None
+    # time.monotonic_ns() readings; 0 means not yet started / completed
+    started_at_ns: int = 0
+    completed_at_ns: int = 0
+
+    def __post_init__(self):
+        self.status = StepStatus.coerce(self.status)
+
+    @property
+    def started_at(self) -> Optional[str]:
+        return _monotonic_to_iso(self.started_at_ns)
+
+    @property
+    def completed_at(self) -> Optional[str]:
+        return _monotonic_to_iso(self.completed_at_ns)
+
+
+class StepSnapshot(NamedTuple):
+    """Immutable view of one step for the UI"""
+    name: str
+    description: str
+    status: StepStatus
+    progress: float
+
+
+class ProgressSnapshot(NamedTuple):
+    """Immutable view of step progress, swapped in whole by update_step"""
+    overall_progress: float
+    current_step: int
+    steps: Tuple[StepSnapshot, ...]
 
 
 @dataclass
@@ -51,18 +118,57 @@ class ProcessingState:
     result: Optional[Dict[str, Any]] = None
     started_at: Optional[str] = None
     completed_at: Optional[str] = None
+    # Running totals behind overall_progress, kept current by update_step
+    _completed_count: int = field(default=0, repr=False)
+    _running_progress_sum: float = field(default=0.0, repr=False)
+    # Bumped by touch() on every change; to_dict() reuses its output until then
+    _version: int = field(default=0, repr=False)
+    _serialized: Optional[Tuple[int, Dict[str, Any]]] = field(default=None, repr=False)
+    # Set by cancel(); the processing thread checks or waits on it
+    cancel_event: threading.Event = field(default_factory=threading.Event, repr=False)
+    # Latest consistent progress frame; the UI reads this instead of the steps
+    snapshot: Optional[ProgressSnapshot] = field(default=None, repr=False)
+
+    def __post_init__(self):
+        for step in self.steps:
+            self._add_step_totals(step, 1)
+        self.publish_snapshot()
+
+    def publish_snapshot(self):
+        """Replace the snapshot with the current progress (one reference swap)"""
+        self.snapshot = ProgressSnapshot(
+            self.overall_progress,
+            self.current_step,
+            tuple(StepSnapshot(s.name, s.description, s.status, s.progress) for s in self.steps)
+        )
+
+    def _add_step_totals(self, step: ProcessingStep, sign: int):
+        """Add (sign=1) or remove (sign=-1) a step's share of the running totals"""
+        if step.status == StepStatus.COMPLETED:
+            self._completed_count += sign
+        elif step.status == StepStatus.RUNNING:
+            self._running_progress_sum += sign * step.progress
+
+    def touch(self):
+        """Mark the state as changed (invalidates the cached to_dict)"""
+        self._version += 1
 
     def to_dict(self) -> Dict[str, Any]:
-        return {
+        """Serialized state; the same dict is returned until touch() (treat as read-only)"""
+        if self._serialized is not None and self._serialized[0] == self._version:
+            return self._serialized[1]
+        data = {
             'status': self.status.value,
             'current_step': self.current_step,
             'steps': [
                 {
                     'name': s.name,
                     'description': s.description,
-                    'status': s.status,
+                    'status': s.status.name.lower(),
                     'progress': s.progress,
                     'error_message': s.error_message,
+                    'started_at': s.started_at,
+                    'completed_at': s.completed_at,
                 }
                 for s in self.steps
             ],
@@ -72,6 +178,8 @@ class ProcessingState:
             'started_at': self.started_at,
             'completed_at': self.completed_at,
         }
+        self._serialized = (self._version, data)
+        return data
 
 
 # Default processing steps
@@ -88,9 +196,17 @@ DEFAULT_STEPS = [
 class BackgroundProcessor:
     """Background processing manager"""
 
-    def __init__(self):
-        """Initialize processor"""
-        self._init_session_state()
+    def __init__(self, state: Optional[ProcessingState] = None):
+        """
+        Initialize processor.
+
+        Args:
+            state: Bind to this state instead of the session's current one
+                (used for the worker, so a later reset() can't redirect it)
+        """
+        self._state = state
+        if state is None:
+            self._init_session_state()
 
     def _init_session_state(self):
         """Initialize session state"""
@@ -104,6 +220,8 @@ class BackgroundProcessor:
     @property
     def state(self) -> ProcessingState:
         """Get current processing state"""
+        if self._state is not None:
+            return self._state
         # Ensure processing_state exists before accessing
         if 'processing_state' not in st.session_state:
             self._init_session_state()
@@ -134,16 +252,22 @@ class BackgroundProcessor:
         self,
         process_func: Callable[['BackgroundProcessor'], Dict[str, Any]],
         custom_steps: Optional[List[ProcessingStep]] = None
-    ):
+    ) -> bool:
         """
         Start background processing.
 
         Args:
-            process_func: Function to execute (receives processor instance)
+            process_func: Function to execute (receives a processor bound to
+                this run's state)
             custom_steps: Optional custom processing steps
+
+        Returns:
+            False if a run is still in progress (including a cancelled one
+            whose worker has not exited yet), True once started
         """
-        if self.is_running:
-            return
+        thread = st.session_state.get('processing_thread')
+        if self.is_running or (thread is not None and thread.is_alive()):
+            return False
 
         # Reset state
         if custom_steps:
@@ -154,84 +278,118 @@ class BackgroundProcessor:
         state = self.state
         state.status = ProcessingStatus.RUNNING
         state.started_at = datetime.now().isoformat()
+        state.touch()
+        worker = BackgroundProcessor(state)
 
         # Start processing in background thread
         def run_process():
             try:
-                result = process_func(self)
+                result = process_func(worker)
+                if state.cancel_event.is_set():
+                    raise ProcessingCancelled()
                 state.result = result
                 state.status = ProcessingStatus.COMPLETED
                 state.completed_at = datetime.now().isoformat()
+                state.touch()
             except Exception as e:
+                # process_func may wrap ProcessingCancelled, so trust the event
+                if isinstance(e, ProcessingCancelled) or state.cancel_event.is_set():
+                    state.status = ProcessingStatus.CANCELLED
+                    state.touch()
+                    return
                 state.error_message = str(e)
                 state.status = ProcessingStatus.ERROR
-                logger.error(f"Processing error: {traceback.format_exc()}")
+                state.touch()
+                logger.error("Processing error", exc_info=True)
 
         thread = threading.Thread(target=run_process, daemon=True)
         st.session_state.processing_thread = thread
         thread.start()
+        return True
 
     def update_step(
         self,
         step_name: str,
-        status: str = "running",
+        status: Union[StepStatus, str] = StepStatus.RUNNING,
         progress: float = 0.0,
         error_message: Optional[str] = None
     ):
-        """Update a processing step"""
+        """Update a processing step (starting or advancing one raises ProcessingCancelled after cancel())"""
         state = self.state
+        status = StepStatus.coerce(status)
+        if status == StepStatus.RUNNING:
+            self.check_cancelled()
 
         for i, step in enumerate(state.steps):
             if step.name == step_name:
+                state._add_step_totals(step, -1)
+                was_running = step.status == StepStatus.RUNNING
                 step.status = status
                 step.progress = progress
                 step.error_message = error_message
 
-                if status == "running":
-                    step.started_at = datetime.now().isoformat()
+                if status == StepStatus.RUNNING:
+                    if not was_running:
+                        step.started_at_ns = time.monotonic_ns()
                     state.current_step = i
-                elif status == "completed":
-                    step.completed_at = datetime.now().isoformat()
+                elif status == StepStatus.COMPLETED:
+                    step.completed_at_ns = time.monotonic_ns()
                     step.progress = 100.0
 
+                state._add_step_totals(step, 1)
                 break
 
-        # Update overall progress
-        completed_steps = sum(1 for s in state.steps if s.status == "completed")
-        current_progress = sum(s.progress for s in state.steps if s.status == "running") / 100
-        state.overall_progress = (completed_steps + current_progress) / len(state.steps)
+        # Update overall progress from the running totals
+        state.overall_progress = (
+            state._completed_count + state._running_progress_sum / 100
+        ) / len(state.steps)
+        state.publish_snapshot()
+        state.touch()
 
     def complete_step(self, step_name: str):
         """Mark a step as completed"""
-        self.update_step(step_name, status="completed", progress=100.0)
+        self.update_step(step_name, status=StepStatus.COMPLETED, progress=100.0)
 
     def set_step_progress(self, step_name: str, progress: float):
         """Set progress for current step"""
-        self.update_step(step_name, status="running", progress=progress)
+        self.update_step(step_name, status=StepStatus.RUNNING, progress=progress)
+
+    def check_cancelled(self):
+        """Raise ProcessingCancelled if cancel() has been called"""
+        if self.state.cancel_event.is_set():
+            raise ProcessingCancelled()
+
+    def wait(self, seconds: float):
+        """Sleep for up to seconds, raising ProcessingCancelled as soon as cancel() is called"""
+        if self.state.cancel_event.wait(seconds):
+            raise ProcessingCancelled()
 
     def cancel(self):
         """Cancel processing"""
+        self.state.cancel_event.set()
         self.state.status = ProcessingStatus.CANCELLED
+        self.state.touch()
 
 
-def render_processing_ui() -> Optional[Dict[str, Any]]:
-    """
-    Render the processing progress UI.
+# Seconds between progress refreshes: a fragment rerun where st.fragment
+# exists (Streamlit 1.37+), otherwise a full-script rerun
+PROGRESS_REFRESH_INTERVAL = 0.1
+FALLBACK_REFRESH_INTERVAL = 0.5
 
-    Returns:
-        Processing result when complete, None otherwise
-    """
-    processor = BackgroundProcessor()
-    state = processor.state
 
-    st.subheader("⚙️ Generating Exhibits")
+def _render_progress(processor: BackgroundProcessor):
+    """Render the progress bar, status message, step list and cancel button."""
+    state = processor.state
+    # One consistent frame for the whole render, even while the worker updates
+    snapshot = state.snapshot
 
     # Overall progress bar
-    st.progress(state.overall_progress)
+    st.progress(snapshot.overall_progress)
 
     # Status message
     if state.status == ProcessingStatus.RUNNING:
-        current_step = state.steps[state.current_step] if state.current_step < len(state.steps) else None
+        steps = snapshot.steps
+        current_step = steps[snapshot.current_step] if snapshot.current_step < len(steps) else None
         if current_step:
             st.info(f"⏳ {current_step.description}")
     elif state.status == ProcessingStatus.COMPLETED:
@@ -244,28 +402,21 @@ def render_processing_ui() -> Optional[Dict[str, Any]]:
     # Step-by-step status
     st.markdown("---")
 
-    for step in state.steps:
+    for step in snapshot.steps:
         col1, col2, col3 = st.columns([0.5, 3, 0.5])
 
         with col1:
-            if step.status == "completed":
-                st.markdown("✅")
-            elif step.status == "running":
-                st.markdown("⏳")
-            elif step.status == "error":
-                st.markdown("❌")
-            else:
-                st.markdown("⬜")
+            st.markdown(_STATUS_ICONS[step.status])
 
         with col2:
             st.write(step.description)
-            if step.status == "running" and step.progress > 0:
+            if step.status == StepStatus.RUNNING and step.progress > 0:
                 st.progress(step.progress / 100)
 
         with col3:
-            if step.status == "completed":
+            if step.status == StepStatus.COMPLETED:
                 st.caption("Done")
-            elif step.status == "running":
+            elif step.status == StepStatus.RUNNING:
                 st.caption(f"{step.progress:.0f}%")
 
     # Cancel button (if running)
@@ -275,9 +426,44 @@ def render_processing_ui() -> Optional[Dict[str, Any]]:
             processor.cancel()
             st.rerun()
 
-        # Auto-refresh while running
-        time.sleep(0.5)
+
+def _render_live_progress():
+    """Progress section re-run on its own timer while processing runs."""
+    processor = BackgroundProcessor()
+    if not processor.is_running:
+        # Finished: rerun the whole page so callers see the final state
         st.rerun()
+    _render_progress(processor)
+
+
+_live_progress = (
+    st.fragment(run_every=PROGRESS_REFRESH_INTERVAL)(_render_live_progress)
+    if hasattr(st, "fragment") else None
+)
+
+
+def render_processing_ui() -> Optional[Dict[str, Any]]:
+    """
+    Render the processing progress UI.
+
+    Returns:
+        Processing result when complete, None otherwise
+    """
+    processor = BackgroundProcessor()
+    state = processor.state
+
+    st.subheader("⚙️ Generating Exhibits")
+
+    if state.status == ProcessingStatus.RUNNING and _live_progress is not None:
+        # Only the fragment refreshes while running, not the whole script
+        _live_progress()
+    else:
+        _render_progress(processor)
+
+        # Auto-refresh while running (Streamlit without st.fragment)
+        if state.status == ProcessingStatus.RUNNING:
+            time.sleep(FALLBACK_REFRESH_INTERVAL)
+            st.rerun()
 
     # Return result if complete
     if state.status == ProcessingStatus.COMPLETED:
@@ -291,9 +477,41 @@ def get_processor() -> BackgroundProcessor:
     return BackgroundProcessor()
 
 
+def _for_each_file(
+    processor: BackgroundProcessor,
+    step_name: str,
+    files: List[Any],
+    work: Callable[[Any], Any],
+    parallel: bool = True
+):
+    """
+    Run work(file) for every file, reporting step progress as files finish.
+
+    With parallel=True the files are spread over a thread pool; progress is
+    still reported from the calling thread only.
+    """
+    if not files:
+        return
+    if not parallel or len(files) == 1:
+        for i, file in enumerate(files):
+            work(file)
+            processor.set_step_progress(step_name, (i + 1) / len(files) * 100)
+        return
+
+    executor = ThreadPoolExecutor(max_workers=min(8, (os.cpu_count() or 1) * 2, len(files)))
+    try:
+        futures = [executor.submit(work, file) for file in files]
+        for done, future in enumerate(as_completed(futures), start=1):
+            future.result()
+            processor.set_step_progress(step_name, done / len(files) * 100)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
 def create_exhibit_processor(
     files: List[Any],
-    options: Dict[str, Any]
+    options: Dict[str, Any],
+    parallel: bool = True
 ) -> Callable[[BackgroundProcessor], Dict[str, Any]]:
     """
     Create a processing function for exhibit generation.
@@ -301,6 +519,7 @@ def create_exhibit_processor(
     Args:
         files: List of files to process
         options: Processing options
+        parallel: Process the files of each per-file step concurrently
 
     Returns:
         Callable that performs the processing
@@ -317,33 +536,27 @@ def create_exhibit_processor(
 
         # Step 1: Extract
         processor.update_step("extract", "running")
-        for i, file in enumerate(files):
-            # Simulate extraction
-            time.sleep(0.1)
-            processor.set_step_progress("extract", (i + 1) / len(files) * 100)
+        # Simulate extraction
+        _for_each_file(processor, "extract", files, lambda file: processor.wait(0.1), parallel)
         processor.complete_step("extract")
 
         # Step 2: Compress
         if options.get('enable_compression', True):
             processor.update_step("compress", "running")
-            for i in range(len(files)):
-                time.sleep(0.1)
-                processor.set_step_progress("compress", (i + 1) / len(files) * 100)
+            _for_each_file(processor, "compress", files, lambda file: processor.wait(0.1), parallel)
             processor.complete_step("compress")
         else:
             processor.complete_step("compress")
 
         # Step 3: Number
         processor.update_step("number", "running")
-        for i in range(len(files)):
-            time.sleep(0.05)
-            processor.set_step_progress("number", (i + 1) / len(files) * 100)
+        _for_each_file(processor, "number", files, lambda file: processor.wait(0.05), parallel)
         processor.complete_step("number")
 
         # Step 4: TOC
         if options.get('add_toc', True):
             processor.update_step("toc", "running")
-            time.sleep(0.2)
+            processor.wait(0.2)
             processor.complete_step("toc")
         else:
             processor.complete_step("toc")
@@ -351,14 +564,14 @@ def create_exhibit_processor(
         # Step 5: Merge
         if options.get('merge_pdfs', True):
             processor.update_step("merge", "running")
-            time.sleep(0.3)
+            processor.wait(0.3)
             processor.complete_step("merge")
         else:
             processor.complete_step("merge")
 
         # Step 6: Finalize
         processor.update_step("finalize", "running")
-        time.sleep(0.2)
+        processor.wait(0.2)
         processor.complete_step("finalize")
 
         return result
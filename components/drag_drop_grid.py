@@ -12,6 +12,8 @@ Provides multiple view modes:
 """
 
 import streamlit as st
+import pandas as pd
+from functools import lru_cache
 from typing import List, Dict, Any, Optional, Tuple
 import json
 import logging
@@ -27,6 +29,9 @@ except ImportError:
     SORTABLES_AVAILABLE = False
     logger.warning("streamlit-sortables not installed. Install with: pip install streamlit-sortables")
 
+# Roman numeral values and symbols, largest first
+_ROMAN_VALUES = (1000, 900, 500, 400, 100, 90, 50, 40, 10, 9, 5, 4, 1)
+_ROMAN_SYMBOLS = ('M', 'CM', 'D', 'CD', 'C', 'XC', 'L', 'XL', 'X', 'IX', 'V', 'IV', 'I')
 
 def render_sortable_grid(
     exhibits: List[Dict[str, Any]],
@@ -52,29 +57,18 @@ def render_sortable_grid(
         st.info("No exhibits to display")
         return exhibits
 
-    # Prepare items for sortables
+    # Prepare items for sortables; ids map straight back to positions
+    id_to_idx = {str(i): i for i in range(len(exhibits))}
     items = []
-    for i, ex in enumerate(exhibits):
+    for item_id, i in id_to_idx.items():
+        ex = exhibits[i]
         items.append({
-            "id": str(i),
+            "id": item_id,
             "name": ex.get("name", ex.get("filename", f"Document {i + 1}"))[:30],
             "criterion": ex.get("criterion_letter", ""),
             "pages": ex.get("page_count", "?")
         })
 
-    # Custom HTML template for items
-    def item_template(item):
-        criterion_badge = f'<span style="background:#10b981;color:white;padding:2px 6px;border-radius:4px;font-size:10px;margin-left:8px;">{item["criterion"]}</span>' if item["criterion"] else ""
-        return f'''
-        <div style="background:white;padding:12px;border-radius:8px;border:1px solid #e0e0e0;margin:4px;cursor:grab;display:flex;justify-content:space-between;align-items:center;">
-            <span style="font-weight:500;">{item["name"]}</span>
-            <span>
-                {criterion_badge}
-                <span style="color:#666;font-size:11px;margin-left:8px;">{item["pages"]} pg</span>
-            </span>
-        </div>
-        '''
-
     # Render sortable list
     try:
         sorted_items = sort_items(
@@ -86,8 +80,8 @@ def render_sortable_grid(
         # Map back to original exhibits
         new_order = []
         for item in sorted_items:
-            original_idx = int(item["id"])
-            if original_idx < len(exhibits):
+            original_idx = id_to_idx.get(item["id"])
+            if original_idx is not None:
                 new_order.append(exhibits[original_idx])
 
         return new_order
@@ -115,35 +109,34 @@ def render_sectioned_sortable(
         st.warning("Drag-and-drop requires streamlit-sortables")
         return {"All": exhibits}
 
-    # Group exhibits by section
-    section_map = {section: [] for section in sections}
-    section_map["Unassigned"] = []
-
-    for exhibit in exhibits:
-        category = exhibit.get("category", "")
-        placed = False
-
-        for section in sections:
-            if section.lower() in category.lower() or category.lower() in section.lower():
-                section_map[section].append(exhibit)
-                placed = True
-                break
+    # Group exhibits by section (cached on categories, as indices)
+    categories = tuple(exhibit.get("category", "") for exhibit in exhibits)
+    section_idx = _group_by_section(categories, tuple(sections))
+    section_map = {
+        section: [exhibits[i] for i in indices]
+        for section, indices in section_idx.items()
+    }
 
-        if not placed:
-            section_map["Unassigned"].append(exhibit)
-
-    # Prepare multi-container items
-    containers = {}
-    for section, items in section_map.items():
-        if items:  # Only show non-empty sections
-            containers[section] = [
-                {
-                    "id": f"{section}_{i}",
-                    "name": item.get("name", "")[:25],
-                    "original_idx": exhibits.index(item) if item in exhibits else i
-                }
-                for i, item in enumerate(items)
-            ]
+    # Prepare multi-container items, reusing the last ones if their
+    # inputs (sections, categories, names) are unchanged
+    names = tuple(exhibit.get("name", "") for exhibit in exhibits)
+    sig = (tuple(sections), categories, names)
+    cached = st.session_state.get("sectioned_containers")
+    if cached is not None and cached[0] == sig:
+        containers = cached[1]
+    else:
+        containers = {}
+        for section, indices in section_idx.items():
+            if indices:  # Only show non-empty sections
+                containers[section] = [
+                    {
+                        "id": f"{section}_{i}",
+                        "name": names[idx][:25],
+                        "original_idx": idx
+                    }
+                    for i, idx in enumerate(indices)
+                ]
+        st.session_state["sectioned_containers"] = (sig, containers)
 
     try:
         # Render with multi-containers
@@ -169,6 +162,43 @@ def render_sectioned_sortable(
         return section_map
 
 
+@st.cache_data(show_spinner=False)
+def _group_by_section(
+    categories: Tuple[str, ...],
+    sections: Tuple[str, ...]
+) -> Dict[str, List[int]]:
+    """
+    Assign each exhibit to the first section matching its category.
+
+    Args:
+        categories: Category of each exhibit, in exhibit order
+        sections: Section names
+
+    Returns:
+        Dict mapping section names (plus "Unassigned") to exhibit indices
+    """
+    section_map = {section: [] for section in sections}
+    section_map["Unassigned"] = []
+
+    # Lowercase each section name once rather than per exhibit
+    sections_lc = [(section, section.lower()) for section in sections]
+
+    for idx, category in enumerate(categories):
+        category_lc = category.lower()
+        placed = False
+
+        for section, section_lc in sections_lc:
+            if section_lc in category_lc or category_lc in section_lc:
+                section_map[section].append(idx)
+                placed = True
+                break
+
+        if not placed:
+            section_map["Unassigned"].append(idx)
+
+    return section_map
+
+
 def render_drag_drop_list(
     exhibits: List[Dict[str, Any]],
     numbering_style: str = "letters"
@@ -176,7 +206,9 @@ def render_drag_drop_list(
     """
     Render a simple drag-and-drop list (fallback when sortables unavailable).
 
-    Uses up/down buttons instead of true drag-drop.
+    Shows one editable table (new positions and delete checkboxes, applied
+    on submit). Moves and deletes only edit a permutation of indices kept in
+    session state; the exhibits list passed in is left as is.
 
     Args:
         exhibits: List of exhibits
@@ -186,73 +218,139 @@ def render_drag_drop_list(
         Reordered exhibits
     """
     st.markdown("### Exhibit Order")
-    st.caption("Use arrows to reorder exhibits")
-
-    for i, exhibit in enumerate(exhibits):
-        cols = st.columns([1, 1, 6, 2, 1, 1])
-
-        # Up button
-        with cols[0]:
-            if i > 0:
-                if st.button("⬆️", key=f"up_{i}", help="Move up"):
-                    exhibits[i], exhibits[i - 1] = exhibits[i - 1], exhibits[i]
-                    st.rerun()
-            else:
-                st.write("")
-
-        # Down button
-        with cols[1]:
-            if i < len(exhibits) - 1:
-                if st.button("⬇️", key=f"down_{i}", help="Move down"):
-                    exhibits[i], exhibits[i + 1] = exhibits[i + 1], exhibits[i]
-                    st.rerun()
-            else:
-                st.write("")
-
-        # Exhibit number
-        if numbering_style == "letters":
-            num = chr(65 + i) if i < 26 else f"A{chr(65 + i - 26)}"
-        elif numbering_style == "numbers":
-            num = str(i + 1)
-        else:
-            num = _to_roman(i + 1)
-
-        # Name
-        with cols[2]:
-            name = exhibit.get("name", exhibit.get("filename", f"Document {i + 1}"))
-            st.markdown(f"**Exhibit {num}:** {name[:40]}")
-
-        # Criterion
-        with cols[3]:
-            criterion = exhibit.get("criterion_letter", "")
-            if criterion:
-                st.markdown(f"Criterion {criterion}")
-
-        # Delete
-        with cols[4]:
-            if st.button("🗑️", key=f"del_{i}"):
-                exhibits.pop(i)
-                st.rerun()
 
+    perm = _get_exhibit_perm(exhibits)
+    ordered = [exhibits[p] for p in perm]
+
+    # Number every exhibit
+    nums = _build_numbering(len(ordered), numbering_style)
+    for exhibit, num in zip(ordered, nums):
         # Update exhibit number
         exhibit["exhibit_number"] = num
         exhibit["number"] = num
 
-    return exhibits
+    st.caption("Edit positions or tick Delete, then apply")
+    _render_order_table(ordered, nums, perm)
+
+    return ordered
+
+
+def _render_order_table(
+    ordered: List[Dict[str, Any]],
+    nums: Tuple[str, ...],
+    perm: List[int]
+):
+    """
+    Render the exhibit order as one data_editor inside a form.
+
+    On submit, rows marked Delete are dropped and the rest are reordered by
+    their Order value (ties keep their current order), by rewriting perm.
+    """
+    # Pull only the displayed fields, then format them column-wise
+    fields = pd.DataFrame.from_records(
+        ordered, columns=["name", "filename", "criterion_letter"]
+    )
+    order = pd.Series(range(1, len(ordered) + 1))
+    names = (
+        fields["name"]
+        .fillna(fields["filename"])
+        .fillna("Document " + order.astype(str))
+    )
+
+    table = pd.DataFrame({
+        "Order": order,
+        "Exhibit": nums,
+        "Name": names.str.slice(0, 40),
+        "Criterion": fields["criterion_letter"].fillna(""),
+        "Delete": False,
+    })
+
+    with st.form("exhibit_order_form"):
+        edited = st.data_editor(
+            table,
+            hide_index=True,
+            use_container_width=True,
+            disabled=["Exhibit", "Name", "Criterion"],
+            column_config={
+                "Order": st.column_config.NumberColumn(min_value=1, step=1, required=True)
+            }
+        )
+        submitted = st.form_submit_button("Apply order")
+
+    if submitted:
+        kept = edited[~edited["Delete"]]
+        positions = kept.sort_values("Order", kind="stable").index
+        perm[:] = [perm[i] for i in positions]
+        st.rerun()
+
+
+def _get_exhibit_perm(exhibits: List[Dict[str, Any]]) -> List[int]:
+    """
+    Display order of exhibits as indices, kept in session state.
+
+    The permutation is tied to the identities of the exhibits it was built
+    for; a different list (e.g. the reordered list fed back in) starts from
+    its own order again.
+    """
+    signature = tuple(map(id, exhibits))
+    saved = st.session_state.get("exhibit_perm")
+    if saved is None or saved[0] != signature:
+        saved = (signature, list(range(len(exhibits))))
+        st.session_state["exhibit_perm"] = saved
+    return saved[1]
+
 
+@lru_cache(maxsize=32)
+def _build_numbering(n: int, style: str) -> Tuple[str, ...]:
+    """Exhibit numbers for n exhibits in the given numbering style."""
+    if style == "letters":
+        return tuple(chr(65 + i) if i < 26 else f"A{chr(65 + i - 26)}" for i in range(n))
+    if style == "numbers":
+        return tuple(str(i + 1) for i in range(n))
+    return tuple(_to_roman(i + 1) for i in range(n))
 
+
+@lru_cache(maxsize=1024)
 def _to_roman(num: int) -> str:
     """Convert number to Roman numeral."""
-    val = [1000, 900, 500, 400, 100, 90, 50, 40, 10, 9, 5, 4, 1]
-    syms = ['M', 'CM', 'D', 'CD', 'C', 'XC', 'L', 'XL', 'X', 'IX', 'V', 'IV', 'I']
     roman = ''
-    for i, v in enumerate(val):
+    for v, sym in zip(_ROMAN_VALUES, _ROMAN_SYMBOLS):
         while num >= v:
-            roman += syms[i]
+            roman += sym
             num -= v
     return roman
 
 
+def _sort_by(
+    exhibits: List[Dict[str, Any]],
+    field: str,
+    default: Any,
+    reverse: bool = False
+):
+    """Stable in-place sort of exhibits by one field, keys read once each."""
+    keys = [ex.get(field, default) for ex in exhibits]
+    order = sorted(range(len(exhibits)), key=keys.__getitem__, reverse=reverse)
+    exhibits[:] = [exhibits[i] for i in order]
+
+
+def _get_original_order(exhibits: List[Dict[str, Any]]) -> Tuple[Dict[str, Any], ...]:
+    """
+    Exhibits in the order first seen by the quick reorder bar.
+
+    Session state keeps a tuple of references, not copies. It is retaken
+    when exhibits are added or removed.
+    """
+    original = st.session_state.get("exhibit_original_order")
+    if (
+        original is None
+        or len(original) != len(exhibits)
+        or {id(ex) for ex in original} != {id(ex) for ex in exhibits}
+    ):
+        original = tuple(exhibits)
+        st.session_state["exhibit_original_order"] = original
+    return original
+
+
 def render_quick_reorder_bar(exhibits: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     """
     Render quick reorder toolbar with common actions.
@@ -265,6 +363,7 @@ def render_quick_reorder_bar(exhibits: List[Dict[str, Any]]) -> List[Dict[str, A
     """
     st.markdown("### Quick Actions")
 
+    original = _get_original_order(exhibits)
     cols = st.columns(5)
 
     with cols[0]:
@@ -280,19 +379,18 @@ def render_quick_reorder_bar(exhibits: List[Dict[str, Any]]) -> List[Dict[str, A
 
     with cols[2]:
         if st.button("📊 By Criterion", help="Group by criterion"):
-            exhibits.sort(key=lambda x: x.get("criterion_letter", "ZZZ"))
+            _sort_by(exhibits, "criterion_letter", "ZZZ")
             st.rerun()
 
     with cols[3]:
         if st.button("📄 By Pages", help="Sort by page count"):
-            exhibits.sort(key=lambda x: x.get("page_count", 0), reverse=True)
+            _sort_by(exhibits, "page_count", 0, reverse=True)
             st.rerun()
 
     with cols[4]:
         if st.button("↩️ Reset", help="Reset to original order"):
-            if "original_exhibit_order" in st.session_state:
-                exhibits = st.session_state.original_exhibit_order.copy()
-                st.rerun()
+            exhibits[:] = original
+            st.rerun()
 
     return exhibits
 
@@ -11,13 +11,98 @@ Email notification on completion.
 
 import streamlit as st
 from dataclasses import dataclass
+from functools import lru_cache
 from typing import Optional, Dict, Any, List
+import atexit
+import base64
+import html
 import os
 import smtplib
-from email.mime.multipart import MIMEMultipart
-from email.mime.base import MIMEBase
-from email.mime.text import MIMEText
-from email import encoders
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from string import Template
+from email.message import EmailMessage as MailMessage
+
+# Attachments are base64-encoded from chunks of this many bytes. A multiple
+# of 57 (one 76-character base64 line) so wrapped chunks join cleanly.
+ATTACHMENT_CHUNK_SIZE = 57 * 1152
+
+# Largest PDF that gets attached (25MB)
+MAX_ATTACHMENT_BYTES = 25 * 1024 * 1024
+
+# Completion email HTML; fields are HTML-escaped before substitution
+_HTML_TEMPLATE = Template("""
+<!DOCTYPE html>
+<html>
+<head>
+    <style>
+        body { font-family: Arial, sans-serif; line-height: 1.6; color: #333; }
+        .container { max-width: 600px; margin: 0 auto; padding: 20px; }
+        .header { background: #1f77b4; color: white; padding: 20px; text-align: center; }
+        .content { padding: 20px; background: #f9f9f9; }
+        .case-details { background: white; padding: 15px; border-radius: 5px; margin: 15px 0; }
+        .case-details table { width: 100%; border-collapse: collapse; }
+        .case-details td { padding: 8px; border-bottom: 1px solid #eee; }
+        .case-details td:first-child { font-weight: bold; width: 40%; }
+        .download-btn { display: inline-block; background: #28a745; color: white; padding: 12px 24px; text-decoration: none; border-radius: 5px; margin: 15px 0; }
+        .footer { text-align: center; padding: 20px; color: #666; font-size: 12px; }
+    </style>
+</head>
+<body>
+    <div class="container">
+        <div class="header">
+            <h1>Visa Exhibit Package Ready</h1>
+        </div>
+        <div class="content">
+            <p>Your visa exhibit package has been generated successfully.</p>
+
+            <div class="case-details">
+                <table>
+                    <tr><td>Beneficiary</td><td>$beneficiary</td></tr>
+                    <tr><td>Petitioner</td><td>$petitioner</td></tr>
+                    <tr><td>Visa Type</td><td>$visa_type</td></tr>
+                    <tr><td>Processing</td><td>$processing</td></tr>
+                    <tr><td>Exhibits</td><td>$exhibit_count</td></tr>
+                    <tr><td>Total Pages</td><td>$page_count</td></tr>
+                </table>
+            </div>
+
+            $download_btn
+
+        </div>
+        <div class="footer">
+            This email was sent automatically by the Visa Exhibit Generator.
+        </div>
+    </div>
+</body>
+</html>
+""")
+
+
+def _read_base64(path: str, wrap: bool = True) -> str:
+    """
+    Base64-encode a file chunk by chunk.
+
+    Never holds the raw file in memory, only one chunk of it plus the
+    encoded text.
+
+    Args:
+        path: File to encode
+        wrap: Break into 76-character lines (for MIME) rather than one line
+
+    Returns:
+        Base64 text
+    """
+    encode = base64.encodebytes if wrap else base64.b64encode
+    parts = []
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(ATTACHMENT_CHUNK_SIZE)
+            if not chunk:
+                break
+            parts.append(encode(chunk).decode('ascii'))
+    return ''.join(parts)
 
 
 @dataclass
@@ -43,6 +128,41 @@ class EmailMessage:
     html_body: Optional[str] = None
     attachment_path: Optional[str] = None
     attachment_name: Optional[str] = None
+    attachment_size: Optional[int] = None  # bytes, if already known
+
+
+def _attachment_size(message: EmailMessage) -> Optional[int]:
+    """Attachment size in bytes, or None if there is no readable attachment"""
+    if not message.attachment_path:
+        return None
+    if message.attachment_size is not None:
+        return message.attachment_size
+    try:
+        return os.stat(message.attachment_path).st_size
+    except OSError:
+        return None
+
+
+@lru_cache(maxsize=1)
+def _default_config() -> EmailConfig:
+    """Load config from environment or secrets (once per process)"""
+    return EmailConfig(
+        provider=os.getenv('EMAIL_PROVIDER', 'smtp'),
+        smtp_server=os.getenv('SMTP_SERVER', 'smtp.gmail.com'),
+        smtp_port=int(os.getenv('SMTP_PORT', '587')),
+        smtp_user=os.getenv('SMTP_USER', ''),
+        smtp_password=os.getenv('SMTP_PASSWORD', ''),
+        sendgrid_api_key=os.getenv('SENDGRID_API_KEY', ''),
+        from_email=os.getenv('EMAIL_FROM', ''),
+        from_name=os.getenv('EMAIL_FROM_NAME', 'Visa Exhibit Generator')
+    )
+
+
+@lru_cache(maxsize=4)
+def _sendgrid_client(api_key: str):
+    """SendGrid client per API key, reused so its HTTP connections are too"""
+    from sendgrid import SendGridAPIClient
+    return SendGridAPIClient(api_key)
 
 
 class EmailSender:
@@ -50,20 +170,49 @@ class EmailSender:
 
     def __init__(self, config: Optional[EmailConfig] = None):
         """Initialize email sender"""
-        self.config = config or self._load_config()
-
-    def _load_config(self) -> EmailConfig:
-        """Load config from environment or secrets"""
-        return EmailConfig(
-            provider=os.getenv('EMAIL_PROVIDER', 'smtp'),
-            smtp_server=os.getenv('SMTP_SERVER', 'smtp.gmail.com'),
-            smtp_port=int(os.getenv('SMTP_PORT', '587')),
-            smtp_user=os.getenv('SMTP_USER', ''),
-            smtp_password=os.getenv('SMTP_PASSWORD', ''),
-            sendgrid_api_key=os.getenv('SENDGRID_API_KEY', ''),
-            from_email=os.getenv('EMAIL_FROM', ''),
-            from_name=os.getenv('EMAIL_FROM_NAME', 'Visa Exhibit Generator')
-        )
+        self.config = config or _default_config()
+        self._smtp: Optional[smtplib.SMTP] = None
+        self._smtp_lock = threading.Lock()
+        self._close_registered = False
+
+    def _smtp_connection(self) -> smtplib.SMTP:
+        """Return the open SMTP session, reconnecting if it has gone stale"""
+        if self._smtp is not None:
+            try:
+                if self._smtp.noop()[0] == 250:
+                    return self._smtp
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._quit_smtp()
+
+        server = smtplib.SMTP(self.config.smtp_server, self.config.smtp_port)
+        try:
+            server.starttls()
+            server.login(self.config.smtp_user, self.config.smtp_password)
+        except Exception:
+            server.close()
+            raise
+
+        self._smtp = server
+        if not self._close_registered:
+            atexit.register(self.close)
+            self._close_registered = True
+        return server
+
+    def _quit_smtp(self):
+        """Drop the SMTP session, ignoring errors from a dead connection"""
+        if self._smtp is None:
+            return
+        try:
+            self._smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            self._smtp.close()
+        self._smtp = None
+
+    def close(self):
+        """Close the persistent SMTP connection, if any"""
+        with self._smtp_lock:
+            self._quit_smtp()
 
     def send(self, message: EmailMessage) -> Dict[str, Any]:
         """
@@ -77,51 +226,93 @@ class EmailSender:
         else:
             return self._send_smtp(message)
 
+    def send_bulk(self, messages: List[EmailMessage]) -> List[Dict[str, Any]]:
+        """
+        Send several emails over one SMTP session.
+
+        Messages sharing an attachment reuse one encoded MIME part.
+
+        Returns:
+            One dict with 'success' and 'error' keys per message
+        """
+        if self.config.provider == "sendgrid":
+            return [self._send_sendgrid(message) for message in messages]
+
+        attachments: Dict[tuple, MailMessage] = {}
+        results = []
+        with self._smtp_lock:
+            for message in messages:
+                results.append(self._deliver_smtp(message, attachments))
+        return results
+
     def _send_smtp(self, message: EmailMessage) -> Dict[str, Any]:
         """Send via SMTP"""
+        with self._smtp_lock:
+            return self._deliver_smtp(message, {})
+
+    def _deliver_smtp(
+        self,
+        message: EmailMessage,
+        attachments: Dict[tuple, MailMessage]
+    ) -> Dict[str, Any]:
+        """Build and send one message on the shared session (lock held)"""
         try:
-            msg = MIMEMultipart()
-            msg['From'] = f"{self.config.from_name} <{self.config.from_email}>"
-            msg['To'] = message.to
-            if message.cc:
-                msg['Cc'] = ", ".join(message.cc)
-            msg['Subject'] = message.subject
-
-            # Body
-            if message.html_body:
-                msg.attach(MIMEText(message.html_body, 'html'))
-            else:
-                msg.attach(MIMEText(message.body, 'plain'))
-
-            # Attachment
-            if message.attachment_path and os.path.exists(message.attachment_path):
-                file_size = os.path.getsize(message.attachment_path)
-                if file_size < 25 * 1024 * 1024:  # 25MB limit
-                    with open(message.attachment_path, 'rb') as f:
-                        part = MIMEBase('application', 'pdf')
-                        part.set_payload(f.read())
-                        encoders.encode_base64(part)
-                        filename = message.attachment_name or os.path.basename(message.attachment_path)
-                        part.add_header('Content-Disposition', f'attachment; filename="{filename}"')
-                        msg.attach(part)
-
-            # Send
+            msg = self._build_mime(message, attachments)
             recipients = [message.to] + (message.cc or [])
-
-            with smtplib.SMTP(self.config.smtp_server, self.config.smtp_port) as server:
-                server.starttls()
-                server.login(self.config.smtp_user, self.config.smtp_password)
-                server.send_message(msg, to_addrs=recipients)
-
+            self._smtp_connection().send_message(msg, to_addrs=recipients)
             return {'success': True, 'error': None}
 
         except Exception as e:
             return {'success': False, 'error': str(e)}
 
+    def _build_mime(
+        self,
+        message: EmailMessage,
+        attachments: Dict[tuple, MailMessage]
+    ) -> MailMessage:
+        """
+        Build the MIME message.
+
+        Args:
+            message: Email to build
+            attachments: Encoded attachment parts by (path, filename); parts
+                are never modified after encoding, so they are shared as is
+        """
+        msg = MailMessage()
+        msg['From'] = f"{self.config.from_name} <{self.config.from_email}>"
+        msg['To'] = message.to
+        if message.cc:
+            msg['Cc'] = ", ".join(message.cc)
+        msg['Subject'] = message.subject
+
+        # Body, with the HTML version as an alternative
+        msg.set_content(message.body)
+        if message.html_body:
+            msg.add_alternative(message.html_body, subtype='html')
+
+        # Attachment
+        file_size = _attachment_size(message)
+        if file_size is not None:
+            if file_size < MAX_ATTACHMENT_BYTES:
+                filename = message.attachment_name or os.path.basename(message.attachment_path)
+                key = (message.attachment_path, filename)
+                part = attachments.get(key)
+                if part is None:
+                    # Pre-encoded payload; add_attachment() would need the raw bytes
+                    part = MailMessage()
+                    part['Content-Type'] = 'application/pdf'
+                    part['Content-Transfer-Encoding'] = 'base64'
+                    part['Content-Disposition'] = f'attachment; filename="{filename}"'
+                    part.set_payload(_read_base64(message.attachment_path))
+                    attachments[key] = part
+                msg.make_mixed()
+                msg.attach(part)
+
+        return msg
+
     def _send_sendgrid(self, message: EmailMessage) -> Dict[str, Any]:
         """Send via SendGrid"""
         try:
-            from sendgrid import SendGridAPIClient
             from sendgrid.helpers.mail import Mail, Attachment, FileContent, FileName, FileType
 
             mail = Mail(
@@ -137,22 +328,19 @@ class EmailSender:
                     mail.add_cc(cc)
 
             # Add attachment
-            if message.attachment_path and os.path.exists(message.attachment_path):
-                file_size = os.path.getsize(message.attachment_path)
-                if file_size < 25 * 1024 * 1024:
-                    import base64
-                    with open(message.attachment_path, 'rb') as f:
-                        data = base64.b64encode(f.read()).decode()
-
+            file_size = _attachment_size(message)
+            if file_size is not None:
+                if file_size < MAX_ATTACHMENT_BYTES:
+                    data = _read_base64(message.attachment_path, wrap=False)
                     attachment = Attachment(
                         FileContent(data),
                         FileName(message.attachment_name or os.path.basename(message.attachment_path)),
                         FileType('application/pdf')
                     )
+                    del data
                     mail.add_attachment(attachment)
 
-            sg = SendGridAPIClient(self.config.sendgrid_api_key)
-            response = sg.send(mail)
+            response = _sendgrid_client(self.config.sendgrid_api_key).send(mail)
 
             return {
                 'success': response.status_code in [200, 201, 202],
@@ -165,12 +353,19 @@ class EmailSender:
             return {'success': False, 'error': str(e)}
 
 
+@lru_cache(maxsize=1)
+def _default_sender() -> EmailSender:
+    """Shared sender for the default config, so its SMTP session is reused"""
+    return EmailSender()
+
+
 def send_completion_email(
     recipient: str,
     case_info: Dict[str, Any],
     file_path: Optional[str] = None,
     download_link: Optional[str] = None,
-    cc_emails: Optional[List[str]] = None
+    cc_emails: Optional[List[str]] = None,
+    file_size: Optional[int] = None
 ) -> Dict[str, Any]:
     """
     Send completion notification email.
@@ -181,6 +376,7 @@ def send_completion_email(
         file_path: Path to exhibit package PDF
         download_link: Optional download link
         cc_emails: Optional CC recipients
+        file_size: Size of file_path in bytes, if the caller already has it
 
     Returns:
         Dict with 'success' and 'error' keys
@@ -211,52 +407,18 @@ Case Details:
 This email was sent automatically by the Visa Exhibit Generator.
     """.strip()
 
-    html_body = f"""
-<!DOCTYPE html>
-<html>
-<head>
-    <style>
-        body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
-        .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
-        .header {{ background: #1f77b4; color: white; padding: 20px; text-align: center; }}
-        .content {{ padding: 20px; background: #f9f9f9; }}
-        .case-details {{ background: white; padding: 15px; border-radius: 5px; margin: 15px 0; }}
-        .case-details table {{ width: 100%; border-collapse: collapse; }}
-        .case-details td {{ padding: 8px; border-bottom: 1px solid #eee; }}
-        .case-details td:first-child {{ font-weight: bold; width: 40%; }}
-        .download-btn {{ display: inline-block; background: #28a745; color: white; padding: 12px 24px; text-decoration: none; border-radius: 5px; margin: 15px 0; }}
-        .footer {{ text-align: center; padding: 20px; color: #666; font-size: 12px; }}
-    </style>
-</head>
-<body>
-    <div class="container">
-        <div class="header">
-            <h1>Visa Exhibit Package Ready</h1>
-        </div>
-        <div class="content">
-            <p>Your visa exhibit package has been generated successfully.</p>
-
-            <div class="case-details">
-                <table>
-                    <tr><td>Beneficiary</td><td>{beneficiary}</td></tr>
-                    <tr><td>Petitioner</td><td>{petitioner}</td></tr>
-                    <tr><td>Visa Type</td><td>{visa_type}</td></tr>
-                    <tr><td>Processing</td><td>{processing}</td></tr>
-                    <tr><td>Exhibits</td><td>{exhibit_count}</td></tr>
-                    <tr><td>Total Pages</td><td>{page_count}</td></tr>
-                </table>
-            </div>
-
-            {f'<a href="{download_link}" class="download-btn">Download Exhibit Package</a>' if download_link else ''}
-
-        </div>
-        <div class="footer">
-            This email was sent automatically by the Visa Exhibit Generator.
-        </div>
-    </div>
-</body>
-</html>
-    """
+    html_body = _HTML_TEMPLATE.substitute(
+        beneficiary=html.escape(str(beneficiary)),
+        petitioner=html.escape(str(petitioner)),
+        visa_type=html.escape(str(visa_type)),
+        processing=html.escape(str(processing)),
+        exhibit_count=html.escape(str(exhibit_count)),
+        page_count=html.escape(str(page_count)),
+        download_btn=(
+            f'<a href="{html.escape(download_link)}" class="download-btn">Download Exhibit Package</a>'
+            if download_link else ''
+        )
+    )
 
     message = EmailMessage(
         to=recipient,
@@ -265,11 +427,61 @@ This email was sent automatically by the Visa Exhibit Generator.
         body=body,
         html_body=html_body,
         attachment_path=file_path,
-        attachment_name=f"Exhibit_Package_{beneficiary.replace(' ', '_')}.pdf" if beneficiary != 'N/A' else None
+        attachment_name=f"Exhibit_Package_{beneficiary.replace(' ', '_')}.pdf" if beneficiary != 'N/A' else None,
+        attachment_size=file_size
     )
 
-    sender = EmailSender()
-    return sender.send(message)
+    return _default_sender().send(message)
+
+
+# Sends run off the script thread; the form polls for the result at this
+# interval (seconds), in a fragment where st.fragment exists
+_EMAIL_EXECUTOR = ThreadPoolExecutor(max_workers=2, thread_name_prefix="email")
+EMAIL_POLL_INTERVAL = 0.5
+
+
+def _render_email_status() -> bool:
+    """
+    Show the state of the email send started from the form, if any.
+
+    Returns:
+        True while the send is still in progress
+    """
+    pending = st.session_state.get("email_send")
+    if pending is None:
+        return False
+
+    future, recipient = pending
+    if not future.done():
+        st.info(f"Sending email to {recipient}...")
+        return True
+
+    del st.session_state["email_send"]
+    try:
+        result = future.result()
+    except Exception as e:
+        result = {'success': False, 'error': str(e)}
+
+    if result['success']:
+        st.success(f"Email sent to {recipient}")
+    else:
+        st.error(f"Failed to send email: {result['error']}")
+    return False
+
+
+def _render_live_email_status():
+    """Sending notice re-run on its own timer until the send finishes."""
+    pending = st.session_state.get("email_send")
+    if pending is None or pending[0].done():
+        # Finished: rerun the whole page so the form shows the result
+        st.rerun()
+    st.info(f"Sending email to {pending[1]}...")
+
+
+_live_email_status = (
+    st.fragment(run_every=EMAIL_POLL_INTERVAL)(_render_live_email_status)
+    if hasattr(st, "fragment") else None
+)
 
 
 def render_email_form(
@@ -299,28 +511,43 @@ def render_email_form(
         beneficiary = case_info.get('beneficiary_name', 'N/A')
         st.info(f"Subject: Visa Exhibit Package Ready - {beneficiary}")
 
-        # Attachment info
-        if file_path and os.path.exists(file_path):
-            file_size = os.path.getsize(file_path) / (1024 * 1024)
-            if file_size < 25:
-                st.success(f"PDF will be attached ({file_size:.1f} MB)")
+        # Attachment info (one stat, reused for the send)
+        file_size = None
+        if file_path:
+            try:
+                file_size = os.stat(file_path).st_size
+            except OSError:
+                file_size = None
+
+        if file_size is not None:
+            size_mb = file_size / (1024 * 1024)
+            if file_size < MAX_ATTACHMENT_BYTES:
+                st.success(f"PDF will be attached ({size_mb:.1f} MB)")
             else:
-                st.warning(f"PDF too large to attach ({file_size:.1f} MB > 25 MB limit)")
-
-        if st.button("Send Email", type="primary", disabled=not recipient):
-            with st.spinner("Sending email..."):
-                result = send_completion_email(
-                    recipient=recipient,
-                    case_info=case_info,
-                    file_path=file_path if file_path and os.path.getsize(file_path) < 25 * 1024 * 1024 else None,
-                    download_link=download_link,
-                    cc_emails=cc_emails
-                )
-
-                if result['success']:
-                    st.success(f"Email sent to {recipient}")
-                else:
-                    st.error(f"Failed to send email: {result['error']}")
+                st.warning(f"PDF too large to attach ({size_mb:.1f} MB > 25 MB limit)")
+        attach = file_size is not None and file_size < MAX_ATTACHMENT_BYTES
+
+        sending = "email_send" in st.session_state
+        if st.button("Send Email", type="primary", disabled=not recipient or sending):
+            future = _EMAIL_EXECUTOR.submit(
+                send_completion_email,
+                recipient=recipient,
+                case_info=case_info,
+                file_path=file_path if attach else None,
+                download_link=download_link,
+                cc_emails=cc_emails,
+                file_size=file_size if attach else None
+            )
+            st.session_state["email_send"] = (future, recipient)
+
+        pending = st.session_state.get("email_send")
+        if pending is not None and not pending[0].done() and _live_email_status is not None:
+            # Only the fragment polls while sending, not the whole script
+            _live_email_status()
+        elif _render_email_status():
+            # Poll by rerunning (Streamlit without st.fragment)
+            time.sleep(EMAIL_POLL_INTERVAL)
+            st.rerun()
 
 
 def render_email_config():
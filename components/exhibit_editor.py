@@ -11,11 +11,65 @@ Manual exhibit reorder with AI text instructions.
 
 import streamlit as st
 from dataclasses import dataclass, field
-from typing import List, Optional, Dict, Any, Callable
+from functools import lru_cache
+from typing import List, Optional, Dict, Any, Callable, Tuple
 import re
 
+# AI instruction patterns, in priority order
+_INSTRUCTION_PATTERNS = (
+    # "move X before Y" or "put X after Y"
+    ("move", r"(?:move|put)\s+(?:exhibit\s+)?(?P<move_src>\w+)\s+(?P<move_pos>before|after)\s+(?:exhibit\s+)?(?P<move_dst>\w+)"),
+    # "group all X together" or "put all X at the beginning/end"
+    ("group", r"(?:group|put)\s+all\s+(?P<group_cat>\w+)\s+(?:together|at the (?P<group_pos>beginning|end))"),
+    # "sort by X"
+    ("sort", r"sort\s+by\s+(?P<sort_key>category|confidence|name|alphabetical)"),
+    # "awards first" or "letters at the end"
+    ("position", r"(?P<pos_cat>\w+)\s+(?P<pos_where>first|at the beginning|at the end|last)"),
+)
+# One regex for all of them. Each alternative is an anchored lookahead, so
+# an earlier pattern wins wherever it occurs, as with separate searches;
+# match.lastgroup names the pattern that matched.
+_INSTRUCTION_RE = re.compile(
+    "|".join(rf"^(?=.*?(?P<{name}>{pattern}))" for name, pattern in _INSTRUCTION_PATTERNS),
+    re.DOTALL
+)
+
+# Roman numeral values and symbols, largest first
+_ROMAN = (
+    (1000, 'M'), (900, 'CM'), (500, 'D'), (400, 'CD'), (100, 'C'), (90, 'XC'),
+    (50, 'L'), (40, 'XL'), (10, 'X'), (9, 'IX'), (5, 'V'), (4, 'IV'), (1, 'I')
+)
 
-@dataclass
+
+def _to_roman(num: int) -> str:
+    """Convert number to Roman numeral"""
+    parts = []
+    for value, symbol in _ROMAN:
+        count, num = divmod(num, value)
+        parts.append(symbol * count)
+    return ''.join(parts)
+
+
+# Precomputed exhibit numbers for the first positions of each style
+_LETTER_LABELS = tuple(chr(65 + i) if i < 26 else f"A{chr(65 + i - 26)}" for i in range(52))
+_ROMAN_LABELS = tuple(_to_roman(i + 1) for i in range(100))
+
+
+def _number_labels(count: int, style: str) -> Tuple[str, ...]:
+    """Exhibit numbers for positions 0..count-1 in the given style"""
+    if style == 'letters':
+        table, label = _LETTER_LABELS, lambda i: f"A{chr(65 + i - 26)}"
+    elif style == 'numbers':
+        table, label = (), lambda i: str(i + 1)
+    else:  # roman
+        table, label = _ROMAN_LABELS, lambda i: _to_roman(i + 1)
+
+    if count <= len(table):
+        return table[:count]
+    return table + tuple(label(i) for i in range(len(table), count))
+
+
+@dataclass(slots=True)
 class ExhibitItem:
     """Represents an exhibit in the editor"""
     id: str
@@ -28,6 +82,11 @@ class ExhibitItem:
     file_path: Optional[str] = None
     order: int = 0
     rotation: int = 0
+    # Lowercased category for matching; set once, category is not reassigned
+    _category_lower: str = field(init=False, default="", repr=False, compare=False)
+
+    def __post_init__(self):
+        self._category_lower = self.category.lower()
 
     def to_dict(self) -> Dict[str, Any]:
         return {
@@ -60,23 +119,46 @@ class ExhibitEditor:
             st.session_state.exhibits = []
         if 'exhibit_order_history' not in st.session_state:
             st.session_state.exhibit_order_history = []
+        if 'exhibit_index' not in st.session_state:
+            st.session_state.exhibit_index = {}
 
     @property
     def exhibits(self) -> List[ExhibitItem]:
-        """Get current exhibit list"""
-        return [
+        """Get current exhibit list (the stored list itself, not a copy)"""
+        stored = st.session_state.exhibits
+        if all(isinstance(e, ExhibitItem) for e in stored):
+            return stored
+        # Older sessions stored dicts; convert once and keep the objects
+        stored = [
             ExhibitItem.from_dict(e) if isinstance(e, dict) else e
-            for e in st.session_state.exhibits
+            for e in stored
         ]
+        st.session_state.exhibits = stored
+        return stored
 
     def set_exhibits(self, exhibits: List[ExhibitItem]):
         """Set the exhibit list"""
-        st.session_state.exhibits = [e.to_dict() for e in exhibits]
+        st.session_state.exhibits = list(exhibits)
+        self._reindex()
         self._save_history()
 
+    def _reindex(self):
+        """Rebuild the exhibit id -> position map"""
+        st.session_state.exhibit_index = {e.id: i for i, e in enumerate(self.exhibits)}
+
+    def _index_of(self, exhibit_id: str) -> Optional[int]:
+        """Position of an exhibit, or None if it is not in the list"""
+        exhibits = self.exhibits
+        idx = st.session_state.exhibit_index.get(exhibit_id)
+        if idx is None or idx >= len(exhibits) or exhibits[idx].id != exhibit_id:
+            # The list was replaced without going through the editor
+            self._reindex()
+            idx = st.session_state.exhibit_index.get(exhibit_id)
+        return idx
+
     def _save_history(self):
         """Save current order to history"""
-        current = [e['id'] for e in st.session_state.exhibits]
+        current = [e.id for e in st.session_state.exhibits]
         st.session_state.exhibit_order_history.append(current)
         # Keep last 10 states
         if len(st.session_state.exhibit_order_history) > 10:
@@ -91,72 +173,43 @@ class ExhibitEditor:
 
     def reorder(self, new_order: List[str]):
         """Reorder exhibits based on list of IDs"""
-        id_to_exhibit = {
-            (e.get('id') if isinstance(e, dict) else e.id): e
-            for e in st.session_state.exhibits
-        }
+        id_to_exhibit = {e.id: e for e in self.exhibits}
         st.session_state.exhibits = [
             id_to_exhibit[eid] for eid in new_order
             if eid in id_to_exhibit
         ]
+        self._reindex()
         self._renumber()
 
     def _renumber(self, style: str = 'letters'):
         """Renumber exhibits based on current order"""
-        for i, e in enumerate(st.session_state.exhibits):
-            if style == 'letters':
-                number = chr(65 + i) if i < 26 else f"A{chr(65 + i - 26)}"
-            elif style == 'numbers':
-                number = str(i + 1)
-            else:  # roman
-                number = self._to_roman(i + 1)
-
-            if isinstance(e, dict):
-                e['number'] = number
-                e['order'] = i
-            else:
-                e.number = number
-                e.order = i
-                st.session_state.exhibits[i] = e.to_dict()
-
-    def _to_roman(self, num: int) -> str:
-        """Convert number to Roman numeral"""
-        val = [1000, 900, 500, 400, 100, 90, 50, 40, 10, 9, 5, 4, 1]
-        syms = ['M', 'CM', 'D', 'CD', 'C', 'XC', 'L', 'XL', 'X', 'IX', 'V', 'IV', 'I']
-        roman = ''
-        i = 0
-        while num > 0:
-            for _ in range(num // val[i]):
-                roman += syms[i]
-                num -= val[i]
-            i += 1
-        return roman
+        exhibits = self.exhibits
+        numbers = _number_labels(len(exhibits), style)
+        for i, (e, number) in enumerate(zip(exhibits, numbers)):
+            e.number = number
+            e.order = i
 
     def rename(self, exhibit_id: str, new_name: str):
         """Rename an exhibit"""
-        for e in st.session_state.exhibits:
-            eid = e.get('id') if isinstance(e, dict) else e.id
-            if eid == exhibit_id:
-                if isinstance(e, dict):
-                    e['name'] = new_name
-                else:
-                    e.name = new_name
-                break
+        idx = self._index_of(exhibit_id)
+        if idx is not None:
+            self.exhibits[idx].name = new_name
 
     def move(self, exhibit_id: str, direction: int):
         """Move exhibit up (-1) or down (+1)"""
-        exhibits = st.session_state.exhibits
-        ids = [e.get('id') if isinstance(e, dict) else e.id for e in exhibits]
-
-        if exhibit_id not in ids:
+        idx = self._index_of(exhibit_id)
+        if idx is None:
             return
 
-        idx = ids.index(exhibit_id)
+        exhibits = self.exhibits
         new_idx = idx + direction
 
-        if 0 <= new_idx < len(ids):
-            ids[idx], ids[new_idx] = ids[new_idx], ids[idx]
-            self.reorder(ids)
+        if 0 <= new_idx < len(exhibits):
+            exhibits[idx], exhibits[new_idx] = exhibits[new_idx], exhibits[idx]
+            index = st.session_state.exhibit_index
+            index[exhibits[idx].id] = idx
+            index[exhibits[new_idx].id] = new_idx
+            self._renumber()
 
     def sort_by_category(self):
         """Sort exhibits by category"""
@@ -184,26 +237,24 @@ class ExhibitEditor:
         instruction_lower = instruction.lower()
         exhibits = self.exhibits
 
-        # Pattern: "move X before Y" or "put X after Y"
-        move_pattern = r"(?:move|put)\s+(?:exhibit\s+)?(\w+)\s+(before|after)\s+(?:exhibit\s+)?(\w+)"
-        match = re.search(move_pattern, instruction_lower)
-        if match:
-            source, position, target = match.groups()
-            return self._move_relative(source.upper(), target.upper(), position == 'before')
-
-        # Pattern: "group all X together" or "put all X at the beginning/end"
-        group_pattern = r"(?:group|put)\s+all\s+(\w+)\s+(?:together|at the (beginning|end))"
-        match = re.search(group_pattern, instruction_lower)
-        if match:
-            category = match.group(1)
-            position = match.group(2)  # 'beginning', 'end', or None
-            return self._group_category(category, position)
-
-        # Pattern: "sort by X"
-        sort_pattern = r"sort\s+by\s+(category|confidence|name|alphabetical)"
-        match = re.search(sort_pattern, instruction_lower)
-        if match:
-            sort_type = match.group(1)
+        match = _INSTRUCTION_RE.search(instruction_lower)
+        if not match:
+            return False
+        kind = match.lastgroup
+
+        if kind == 'move':
+            return self._move_relative(
+                match.group('move_src').upper(),
+                match.group('move_dst').upper(),
+                match.group('move_pos') == 'before'
+            )
+
+        if kind == 'group':
+            position = match.group('group_pos')  # 'beginning', 'end', or None
+            return self._group_category(match.group('group_cat'), position)
+
+        if kind == 'sort':
+            sort_type = match.group('sort_key')
             if sort_type == 'category':
                 self.sort_by_category()
             elif sort_type == 'confidence':
@@ -212,15 +263,10 @@ class ExhibitEditor:
                 self.sort_alphabetical()
             return True
 
-        # Pattern: "awards first" or "letters at the end"
-        position_pattern = r"(\w+)\s+(first|at the beginning|at the end|last)"
-        match = re.search(position_pattern, instruction_lower)
-        if match:
-            category = match.group(1)
-            position = 'beginning' if match.group(2) in ['first', 'at the beginning'] else 'end'
-            return self._group_category(category, position)
-
-        return False
+        # kind == 'position'
+        category = match.group('pos_cat')
+        position = 'beginning' if match.group('pos_where') in ['first', 'at the beginning'] else 'end'
+        return self._group_category(category, position)
 
     def _move_relative(self, source: str, target: str, before: bool) -> bool:
         """Move source exhibit before/after target"""
@@ -252,9 +298,16 @@ class ExhibitEditor:
         exhibits = self.exhibits
         category_lower = category.lower()
 
-        # Find matching exhibits
-        matching = [e for e in exhibits if category_lower in e.category.lower()]
-        non_matching = [e for e in exhibits if category_lower not in e.category.lower()]
+        # Split into matching / non-matching in one pass, noting the first match
+        matching, non_matching = [], []
+        first_idx = None
+        for i, e in enumerate(exhibits):
+            if category_lower in e._category_lower:
+                if first_idx is None:
+                    first_idx = i
+                matching.append(e)
+            else:
+                non_matching.append(e)
 
         if not matching:
             return False
@@ -264,15 +317,31 @@ class ExhibitEditor:
         elif position == 'end':
             new_order = non_matching + matching
         else:
-            # Just group together, keep relative position
-            # Find first matching and insert all there
-            first_idx = next(i for i, e in enumerate(exhibits) if category_lower in e.category.lower())
-            new_order = exhibits[:first_idx] + matching + [e for e in exhibits[first_idx:] if e not in matching]
+            # Just group together, keep relative position: everything before
+            # the first match is non-matching, so insert the group there
+            new_order = non_matching[:first_idx] + matching + non_matching[first_idx:]
 
         self.set_exhibits(new_order)
         return True
 
 
+@lru_cache(maxsize=512)
+def _row_html(
+    number: str,
+    category: str,
+    confidence: float,
+    pages: int,
+    filename: str
+) -> Tuple[str, str, str, str]:
+    """Number badge, file caption, category badge and confidence caption for one row"""
+    return (
+        f"<div style='background:#1f77b4; color:white; padding:0.5rem; border-radius:0.25rem; text-align:center; font-weight:bold;'>{number}</div>",
+        f"📄 {filename} | {pages} pages",
+        f"<span style='background:#e0e0e0; padding:0.25rem 0.5rem; border-radius:0.25rem;'>{category}</span>",
+        f"Confidence: {confidence:.0%}",
+    )
+
+
 def render_exhibit_editor(numbering_style: str = 'letters') -> List[ExhibitItem]:
     """
     Render the exhibit editor interface.
@@ -288,8 +357,9 @@ def render_exhibit_editor(numbering_style: str = 'letters') -> List[ExhibitItem]
     st.subheader("✏️ Review & Reorder Exhibits")
 
     # Quick actions and editor when in list view
+    exhibits = editor.exhibits
 
-    if not editor.exhibits:
+    if not exhibits:
         st.info("No exhibits to edit. Complete the classification stage first.")
         return []
 
@@ -349,12 +419,15 @@ def render_exhibit_editor(numbering_style: str = 'letters') -> List[ExhibitItem]
     # Exhibit list
     st.markdown("**📋 Exhibit Order** (drag to reorder)")
 
-    for i, exhibit in enumerate(editor.exhibits):
+    for i, exhibit in enumerate(exhibits):
+        badge_html, file_caption, category_html, confidence_caption = _row_html(
+            exhibit.number, exhibit.category, exhibit.confidence, exhibit.pages, exhibit.filename
+        )
         col1, col2, col3, col4, col5 = st.columns([0.5, 2.5, 1.5, 1, 0.5])
 
         with col1:
             # Exhibit number badge
-            st.markdown(f"<div style='background:#1f77b4; color:white; padding:0.5rem; border-radius:0.25rem; text-align:center; font-weight:bold;'>{exhibit.number}</div>", unsafe_allow_html=True)
+            st.markdown(badge_html, unsafe_allow_html=True)
 
         with col2:
             # Editable name
@@ -367,12 +440,12 @@ def render_exhibit_editor(numbering_style: str = 'letters') -> List[ExhibitItem]
             if new_name != exhibit.name:
                 editor.rename(exhibit.id, new_name)
 
-            st.caption(f"📄 {exhibit.filename} | {exhibit.pages} pages")
+            st.caption(file_caption)
 
         with col3:
             # Category badge
-            st.markdown(f"<span style='background:#e0e0e0; padding:0.25rem 0.5rem; border-radius:0.25rem;'>{exhibit.category}</span>", unsafe_allow_html=True)
-            st.caption(f"Confidence: {exhibit.confidence:.0%}")
+            st.markdown(category_html, unsafe_allow_html=True)
+            st.caption(confidence_caption)
 
         with col4:
             # Reorder buttons
@@ -383,7 +456,7 @@ def render_exhibit_editor(numbering_style: str = 'letters') -> List[ExhibitItem]
                         editor.move(exhibit.id, -1)
                         st.rerun()
             with btn_col2:
-                if i < len(editor.exhibits) - 1:
+                if i < len(exhibits) - 1:
                     if st.button("↓", key=f"down_{exhibit.id}"):
                         editor.move(exhibit.id, 1)
                         st.rerun()
@@ -394,9 +467,9 @@ def render_exhibit_editor(numbering_style: str = 'letters') -> List[ExhibitItem]
         st.markdown("---")
 
     # Summary
-    st.info(f"📊 {len(editor.exhibits)} exhibits | Order will be applied when generating")
+    st.info(f"📊 {len(exhibits)} exhibits | Order will be applied when generating")
 
-    return editor.exhibits
+    return exhibits
 
 
 def get_exhibits() -> List[ExhibitItem]:
@@ -408,14 +481,8 @@ def get_exhibits() -> List[ExhibitItem]:
 def set_exhibits_from_classifications(classifications: List[Any], numbering_style: str = 'letters'):
     """Convert classifications to exhibits"""
     exhibits = []
-    for i, c in enumerate(classifications):
-        if numbering_style == 'letters':
-            number = chr(65 + i) if i < 26 else f"A{chr(65 + i - 26)}"
-        elif numbering_style == 'numbers':
-            number = str(i + 1)
-        else:
-            number = _to_roman(i + 1)
-
+    numbers = _number_labels(len(classifications), numbering_style)
+    for i, (c, number) in enumerate(zip(classifications, numbers)):
         # Support both dict-based and object-based classification results safely
         if isinstance(c, dict):
             name = c.get('criterion_name', 'Unknown')
@@ -449,16 +516,3 @@ def set_exhibits_from_classifications(classifications: List[Any], numbering_styl
     editor = ExhibitEditor()
     editor.set_exhibits(exhibits)
 
-
-def _to_roman(num: int) -> str:
-    """Convert number to Roman numeral"""
-    val = [1000, 900, 500, 400, 100, 90, 50, 40, 10, 9, 5, 4, 1]
-    syms = ['M', 'CM', 'D', 'CD', 'C', 'XC', 'L', 'XL', 'X', 'IX', 'V', 'IV', 'I']
-    roman = ''
-    i = 0
-    while num > 0:
-        for _ in range(num // val[i]):
-            roman += syms[i]
-            num -= val[i]
-        i += 1
-    return roman
@@ -13,11 +13,11 @@ Per 8 CFR 214.2(o)(2)(iv)(E):
 """
 
 import streamlit as st
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass
 from typing import Optional, Dict, Any
 
 
-@dataclass
+@dataclass(slots=True)
 class CaseContext:
     """Case context data - all fields optional"""
     visa_category: Optional[str] = None
@@ -27,12 +27,25 @@ class CaseContext:
     processing_type: Optional[str] = None
 
     def to_dict(self) -> Dict[str, Any]:
-        """Convert to dictionary"""
-        return {k: v for k, v in asdict(self).items() if v is not None}
+        """Convert to dictionary (set fields only)"""
+        fields = (
+            ('visa_category', self.visa_category),
+            ('beneficiary_name', self.beneficiary_name),
+            ('petitioner_name', self.petitioner_name),
+            ('petition_structure', self.petition_structure),
+            ('processing_type', self.processing_type),
+        )
+        return {k: v for k, v in fields if v is not None}
 
     def is_empty(self) -> bool:
         """Check if all fields are empty"""
-        return all(v is None for v in asdict(self).values())
+        return (
+            self.visa_category is None
+            and self.beneficiary_name is None
+            and self.petitioner_name is None
+            and self.petition_structure is None
+            and self.processing_type is None
+        )
 
 
 # Visa petition categories
@@ -73,6 +86,13 @@ PETITION_STRUCTURES = {
     }
 }
 
+# Radio options and reverse lookups from a structure's label
+_STRUCTURE_OPTIONS = ["None selected"] + [
+    info['label'] for key, info in PETITION_STRUCTURES.items() if key != ""
+]
+_LABEL_TO_KEY = {info['label']: key for key, info in PETITION_STRUCTURES.items() if key}
+_LABEL_TO_DESC = {info['label']: info['description'] for info in PETITION_STRUCTURES.values()}
+
 # Processing types
 PROCESSING_TYPES = [
     "",  # Empty option
@@ -149,33 +169,19 @@ def render_intake_form() -> CaseContext:
     st.markdown("**Petition Structure Type** *(per 8 CFR 214.2(o)(2)(iv)(E))*")
     st.caption("How is this petition being filed?")
 
-    # Create radio options
-    structure_options = ["None selected"] + [
-        f"{info['label']}"
-        for key, info in PETITION_STRUCTURES.items()
-        if key != ""
-    ]
-
     selected_structure_label = st.radio(
         "Petition Structure",
-        options=structure_options,
+        options=_STRUCTURE_OPTIONS,
         label_visibility="collapsed",
         horizontal=False
     )
 
     # Show description for selected structure
     if selected_structure_label != "None selected":
-        for key, info in PETITION_STRUCTURES.items():
-            if info['label'] == selected_structure_label:
-                st.info(f"📋 {info['description']}")
-                break
+        st.info(f"📋 {_LABEL_TO_DESC.get(selected_structure_label, '')}")
 
     # Map selection back to key
-    petition_structure = None
-    for key, info in PETITION_STRUCTURES.items():
-        if info['label'] == selected_structure_label and key != "":
-            petition_structure = key
-            break
+    petition_structure = _LABEL_TO_KEY.get(selected_structure_label)
 
     # Update session state
     context = CaseContext(
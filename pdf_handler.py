@@ -4,6 +4,8 @@ Handles merging, numbering, TOC generation, compression
 """
 
 import os
+import shutil
+import subprocess
 from typing import List, Dict, Optional
 from datetime import datetime
 from PyPDF2 import PdfReader, PdfWriter, PdfMerger
@@ -23,6 +25,10 @@ try:
 except ImportError:
     COMPRESSION_AVAILABLE = False
 
+# External merge tools (stream-concatenate and dedupe shared resources)
+QPDF_PATH = shutil.which('qpdf')
+PDFTK_PATH = shutil.which('pdftk')
+
 
 class PDFHandler:
     """Handle all PDF operations including compression"""
@@ -61,10 +67,6 @@ class PDFHandler:
         Returns:
             Path to generated cover page PDF
         """
-        from reportlab.lib.pagesizes import letter
-        from reportlab.pdfgen import canvas
-        import os
-        
         cover_path = os.path.join(self.temp_dir, f"cover_{exhibit_number}.pdf")
         
         try:
@@ -277,17 +279,48 @@ class PDFHandler:
         Returns:
             Path to merged PDF
         """
-        merger = PdfMerger()
+        existing_paths = [p for p in pdf_paths if os.path.exists(p)]
+
+        if existing_paths and self._merge_with_external_tool(existing_paths, output_path):
+            return output_path
+
+        # Each input is parsed exactly once and appended whole; PdfWriter.append
+        # copies page objects across without rebuilding outlines
+        writer = PdfWriter()
 
-        for pdf_path in pdf_paths:
-            if os.path.exists(pdf_path):
-                merger.append(pdf_path)
+        for pdf_path in existing_paths:
+            reader = PdfReader(pdf_path)
+            writer.append(reader, import_outline=False)
+            del reader
 
-        merger.write(output_path)
-        merger.close()
+        with open(output_path, 'wb') as output_file:
+            writer.write(output_file)
 
         return output_path
 
+    def _merge_with_external_tool(self, pdf_paths: List[str], output_path: str) -> bool:
+        """Merge with qpdf or pdftk if installed. Returns True on success."""
+        if QPDF_PATH:
+            cmd = [QPDF_PATH, '--empty', '--pages', *pdf_paths, '--', output_path]
+            ok_codes = (0, 3)  # 3 = succeeded with warnings
+        elif PDFTK_PATH:
+            cmd = [PDFTK_PATH, *pdf_paths, 'cat', 'output', output_path]
+            ok_codes = (0,)
+        else:
+            return False
+
+        try:
+            result = subprocess.run(cmd, capture_output=True, text=True)
+        except OSError as e:
+            print(f"External PDF merge failed: {e}")
+            return False
+
+        if result.returncode in ok_codes and os.path.exists(output_path):
+            return True
+
+        print(f"External PDF merge failed ({result.returncode}): {result.stderr.strip()}")
+        return False
+
     def generate_toc(
         self,
         exhibits: List[Dict],